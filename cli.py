@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+واجهة سطر الأوامر لنظام CRM محل الخياطة (بدون واجهة رسومية)
+
+لا تستورد أي وحدة من PyQt، لذا تبدأ بسرعة وتصلح للمهام المجدولة والتكامل.
+جميع النتائج تُكتب إلى stdout بصيغة JSON (سطر لكل نتيجة)، والرسائل إلى stderr.
+
+أمثلة:
+    python cli.py customers search 0501234567
+    python cli.py orders add --customer 3 --type "ثوب" --total 250
+    python cli.py report --from 2024-01-01 --to 2024-01-31
+    python cli.py batch < jobs.jsonl
+"""
+
+import argparse
+import contextlib
+import json
+import sys
+
+from logic import CRMLogic
+from models import Customer, Order, Payment
+from sync import SyncError
+
+
+class CommandError(Exception):
+    """خطأ في تنفيذ أمر"""
+
+
+def _require(result, message):
+    """التحقق من نجاح عملية في منطق العمل"""
+    if result is None or result is False:
+        raise CommandError(message)
+    return result
+
+
+# ==================== العملاء ====================
+
+def customers_list(crm, args):
+    return [c.to_dict() for c in crm.get_all_customers()]
+
+
+def customers_search(crm, args):
+    return [c.to_dict() for c in crm.search_customers(args["term"])]
+
+
+def customers_show(crm, args):
+    profile = _require(crm.get_customer_profile(int(args["id"])), "العميل غير موجود")
+    return {
+        "customer": profile["customer"].to_dict(),
+        "orders": profile["orders"],
+        "measurements": [m.to_dict() for m in profile["measurements"]],
+        "appointments": [a.to_dict() for a in profile["appointments"]],
+        "totals": profile["totals"],
+    }
+
+
+def customers_add(crm, args):
+    customer = Customer(name=args["name"], phone=args.get("phone") or "",
+                        address=args.get("address") or "", email=args.get("email") or "")
+    return {"id": _require(crm.add_customer(customer), "تعذر إضافة العميل")}
+
+
+def customers_balances(crm, args):
+    return crm.get_customer_balances(args.get("sort") or "amount")
+
+
+def customers_duplicates(crm, args):
+    return [{"reason": group["reason"], "confirmed": group["confirmed"],
+             "customers": [c.to_dict() for c in group["customers"]]}
+            for group in crm.find_duplicate_customers()]
+
+
+# ==================== الطلبات والمدفوعات ====================
+
+def orders_list(crm, args):
+    if args.get("customer"):
+        return [o.to_dict() for o in crm.get_orders_by_customer(int(args["customer"]))]
+    return crm.get_all_orders()
+
+
+def orders_unpaid(crm, args):
+    return crm.get_unpaid_orders(args.get("sort") or "amount")
+
+
+def orders_overdue(crm, args):
+    return crm.get_overdue_orders(args.get("sort") or "days")
+
+
+def orders_ready(crm, args):
+    return crm.get_ready_orders(args.get("sort") or "days")
+
+
+def orders_add(crm, args):
+    order = Order(customer_id=int(args["customer"]), order_type=args["type"],
+                  total_amount=float(args.get("total") or 0),
+                  paid_amount=float(args.get("paid") or 0),
+                  delivery_date=args.get("delivery") or None, notes=args.get("notes") or "")
+    if args.get("status"):
+        order.status = args["status"]
+    return {"id": _require(crm.add_order(order), "تعذر إضافة الطلب")}
+
+
+def payments_add(crm, args):
+    payment = Payment(order_id=int(args["order"]), amount=float(args["amount"]),
+                      notes=args.get("notes") or "")
+    if args.get("method"):
+        payment.payment_method = args["method"]
+    return {"id": _require(crm.add_payment(payment), "تعذر إضافة الدفعة")}
+
+
+# ==================== التقارير والبيانات ====================
+
+def report(crm, args):
+    return _require(crm.get_report(args.get("date_from"), args.get("date_to")) or None,
+                    "تعذر إعداد التقرير")
+
+
+def export_table(crm, args):
+    import csv
+    from repository import TABLES
+
+    repositories = {table: getattr(crm, table) for table in TABLES.values()}
+    repository = repositories.get(args["table"])
+    if repository is None:
+        raise CommandError(f"جدول غير معروف: {args['table']}")
+
+    output = args.get("output")
+    stream = args.get("stream")
+    if not output and stream is None:
+        raise CommandError("يجب تحديد ملف الإخراج")
+
+    rows = [obj.to_dict() for obj in repository.find(order_by="id")]
+    with (open(output, "w", encoding="utf-8", newline="") if output
+          else contextlib.nullcontext(stream)) as fh:
+        if args.get("format") == "csv":
+            writer = csv.DictWriter(fh, fieldnames=repository.sql.columns)
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                fh.write(json.dumps(row, ensure_ascii=False) + "\n")
+    return {"table": args["table"], "rows": len(rows)}
+
+
+def invoices(crm, args):
+    from invoices import InvoiceRenderer
+
+    order_ids = args.get("ids")
+    if not order_ids:
+        if not (args.get("date_from") or args.get("date_to")):
+            raise CommandError("يجب تحديد أرقام الطلبات أو فترة زمنية")
+        rows = crm.db.execute_query('''
+            SELECT id FROM orders
+            WHERE order_date >= ? AND order_date < date(?, '+1 day')
+            ORDER BY id
+        ''', (args.get("date_from") or "0000-01-01", args.get("date_to") or "9999-01-01"))
+        order_ids = [row["id"] for row in rows or []]
+
+    paths = InvoiceRenderer(crm).render_batch([int(i) for i in order_ids], args["output_dir"],
+                                              pdf=bool(args.get("pdf")),
+                                              workers=args.get("workers"))
+    return {"invoices": len(paths), "output_dir": args["output_dir"]}
+
+
+def receipt(crm, args):
+    from invoices import InvoiceRenderer, write_document
+
+    html = _require(InvoiceRenderer(crm).receipt_html(int(args["id"])), "الدفعة غير موجودة")
+    return {"file": write_document(html, args["output"])}
+
+
+def import_customers(crm, args):
+    import csv
+
+    added = skipped = 0
+    with open(args["file"], encoding="utf-8-sig", newline="") as fh, crm.db.transaction():
+        for row in csv.DictReader(fh):
+            customer = Customer(name=row.get("name", ""), phone=row.get("phone") or "",
+                                address=row.get("address") or "", email=row.get("email") or "")
+            if customer.name and crm.add_customer(customer):
+                added += 1
+            else:
+                skipped += 1
+    return {"added": added, "skipped": skipped}
+
+
+def backup(crm, args):
+    import sqlite3
+
+    source = crm.db.get_connection()
+    target = sqlite3.connect(args["destination"])
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+    return {"destination": args["destination"]}
+
+
+def maintenance(crm, args):
+    from maintenance import DatabaseMaintenance
+
+    tasks = DatabaseMaintenance(crm.db)
+    if args.get("health"):
+        return tasks.health()
+    rows = crm.db.execute_query("PRAGMA integrity_check")
+    result = {"integrity": [row[0] for row in rows or []]}
+    result.update(tasks.run_full())
+    result["health"] = tasks.health()
+    return result
+
+
+def reminders(crm, args):
+    from reminders import ReminderScheduler
+
+    scheduler = ReminderScheduler(crm)
+    if args.get("export"):
+        count = scheduler.export_worklist(args["export"], args.get("day"))
+        return {"file": args["export"], "reminders": count}
+    return [r.to_dict() for r in scheduler.worklist(args.get("day"))]
+
+
+def sync_export(crm, args):
+    from sync import BranchSync
+
+    sync = BranchSync(crm.db, args.get("origin"))
+    since = args.get("since")
+    count = sync.export_changes(args["file"], args["peer"],
+                                int(since) if since is not None else None)
+    return {"origin": sync.origin, "peer": args["peer"], "changes": count}
+
+
+def sync_import(crm, args):
+    from sync import BranchSync
+
+    sync = BranchSync(crm.db, args.get("origin"))
+    return sync.import_changes(args["file"])
+
+
+def sync_reset_origin(crm, args):
+    from sync import BranchSync
+
+    sync = BranchSync(crm.db)
+    previous = sync.origin
+    return {"previous": previous, "origin": sync.reset_origin(args.get("origin"))}
+
+
+COMMANDS = {
+    "customers.list": customers_list,
+    "customers.search": customers_search,
+    "customers.show": customers_show,
+    "customers.add": customers_add,
+    "customers.balances": customers_balances,
+    "customers.duplicates": customers_duplicates,
+    "orders.list": orders_list,
+    "orders.unpaid": orders_unpaid,
+    "orders.overdue": orders_overdue,
+    "orders.ready": orders_ready,
+    "orders.add": orders_add,
+    "payments.add": payments_add,
+    "report": report,
+    "export": export_table,
+    "invoices": invoices,
+    "receipt": receipt,
+    "import.customers": import_customers,
+    "backup": backup,
+    "maintenance": maintenance,
+    "reminders": reminders,
+    "sync.export": sync_export,
+    "sync.import": sync_import,
+    "sync.reset-origin": sync_reset_origin,
+}
+
+# أوامر لا تصلح داخل معاملة الدفعة الواحدة
+NON_BATCH_COMMANDS = {"backup", "maintenance"}
+
+
+# ==================== وضع الدفعات ====================
+
+def run_batch(crm, lines, out):
+    """
+    تنفيذ أوامر JSONL من stdin في معاملة واحدة، مثل:
+        {"command": "orders.add", "args": {"customer": 3, "type": "ثوب", "total": 250}}
+    أي خطأ يلغي الدفعة كاملة
+    """
+    results = []
+    try:
+        with crm.db.transaction():
+            for line_number, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    name = request["command"]
+                    handler = COMMANDS.get(name)
+                    if handler is None or name in NON_BATCH_COMMANDS:
+                        raise CommandError(f"أمر غير مدعوم في وضع الدفعات: {name}")
+                    result = handler(crm, request.get("args") or {})
+                except Exception as e:
+                    raise CommandError(f"السطر {line_number}: {e}") from e
+                results.append({"line": line_number, "command": name, "result": result})
+    except CommandError as e:
+        out.write(json.dumps({"error": str(e), "rolled_back": True}, ensure_ascii=False) + "\n")
+        return 1
+
+    for result in results:
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+    return 0
+
+
+# ==================== تحليل الأوامر ====================
+
+def build_parser():
+    """بناء محلل الأوامر"""
+    parser = argparse.ArgumentParser(prog="tailor-crm",
+                                     description="إدارة محل الخياطة من سطر الأوامر")
+    parser.add_argument("--db", default="tailor_crm.db", help="مسار قاعدة البيانات")
+    commands = parser.add_subparsers(dest="group", required=True)
+
+    customers = commands.add_parser("customers", help="العملاء").add_subparsers(
+        dest="action", required=True)
+    customers.add_parser("list")
+    customers.add_parser("search").add_argument("term")
+    customers.add_parser("show").add_argument("id", type=int)
+    add = customers.add_parser("add")
+    add.add_argument("--name", required=True)
+    add.add_argument("--phone")
+    add.add_argument("--address")
+    add.add_argument("--email")
+    customers.add_parser("balances").add_argument("--sort", choices=["amount", "days"])
+    customers.add_parser("duplicates")
+
+    orders = commands.add_parser("orders", help="الطلبات").add_subparsers(
+        dest="action", required=True)
+    orders.add_parser("list").add_argument("--customer", type=int)
+    for view in ("unpaid", "overdue", "ready"):
+        orders.add_parser(view).add_argument("--sort", choices=["amount", "days"])
+    add = orders.add_parser("add")
+    add.add_argument("--customer", type=int, required=True)
+    add.add_argument("--type", required=True)
+    add.add_argument("--total", type=float, default=0.0)
+    add.add_argument("--paid", type=float, default=0.0)
+    add.add_argument("--delivery")
+    add.add_argument("--status")
+    add.add_argument("--notes")
+
+    payments = commands.add_parser("payments", help="المدفوعات").add_subparsers(
+        dest="action", required=True)
+    add = payments.add_parser("add")
+    add.add_argument("--order", type=int, required=True)
+    add.add_argument("--amount", type=float, required=True)
+    add.add_argument("--method")
+    add.add_argument("--notes")
+
+    report_parser = commands.add_parser("report", help="تقرير ملخص")
+    report_parser.add_argument("--from", dest="date_from")
+    report_parser.add_argument("--to", dest="date_to")
+
+    export_parser = commands.add_parser("export", help="تصدير جدول")
+    export_parser.add_argument("table")
+    export_parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+    export_parser.add_argument("-o", "--output")
+
+    invoices_parser = commands.add_parser("invoices", help="إصدار فواتير الطلبات")
+    invoices_parser.add_argument("ids", nargs="*", type=int, help="أرقام الطلبات")
+    invoices_parser.add_argument("--from", dest="date_from", help="طلبات من تاريخ (YYYY-MM-DD)")
+    invoices_parser.add_argument("--to", dest="date_to", help="طلبات حتى تاريخ (YYYY-MM-DD)")
+    invoices_parser.add_argument("-o", "--output-dir", required=True)
+    invoices_parser.add_argument("--pdf", action="store_true", help="PDF إذا توفر محول محلي")
+    invoices_parser.add_argument("--workers", type=int, help="عدد العمليات المتوازية")
+
+    receipt_parser = commands.add_parser("receipt", help="إيصال دفعة")
+    receipt_parser.add_argument("id", type=int)
+    receipt_parser.add_argument("-o", "--output", required=True, help="ملف .html أو .pdf")
+
+    imports = commands.add_parser("import", help="استيراد بيانات").add_subparsers(
+        dest="action", required=True)
+    imports.add_parser("customers").add_argument("file")
+
+    commands.add_parser("backup", help="نسخة احتياطية").add_argument("destination")
+    maintenance_parser = commands.add_parser("maintenance", help="صيانة قاعدة البيانات")
+    maintenance_parser.add_argument("--health", action="store_true",
+                                    help="عرض ملخص صحة القاعدة فقط دون صيانة")
+
+    reminders_parser = commands.add_parser("reminders", help="قائمة عمل التذكيرات")
+    reminders_parser.add_argument("--day", help="اليوم (YYYY-MM-DD)، افتراضياً اليوم")
+    reminders_parser.add_argument("--export", help="تصدير قائمة العمل إلى ملف CSV")
+
+    sync = commands.add_parser("sync", help="مزامنة الفروع").add_subparsers(
+        dest="action", required=True)
+    export_sync = sync.add_parser("export")
+    export_sync.add_argument("file")
+    export_sync.add_argument("--peer", required=True)
+    export_sync.add_argument("--since", type=int)
+    export_sync.add_argument("--origin")
+    import_sync = sync.add_parser("import")
+    import_sync.add_argument("file")
+    import_sync.add_argument("--origin")
+    reset_sync = sync.add_parser("reset-origin", help="اسم فرع جديد لقاعدة منسوخة من فرع آخر")
+    reset_sync.add_argument("--origin")
+
+    commands.add_parser("batch", help="تنفيذ أوامر JSONL من stdin في معاملة واحدة")
+    return parser
+
+
+def main(argv=None):
+    """نقطة دخول سطر الأوامر"""
+    args = build_parser().parse_args(argv)
+    out = sys.stdout
+
+    # رسائل منطق العمل تذهب إلى stderr حتى يبقى stdout نظيفاً للنتائج
+    with contextlib.redirect_stdout(sys.stderr):
+        crm = CRMLogic(args.db)
+
+        if args.group == "batch":
+            return run_batch(crm, sys.stdin, out)
+
+        name = args.group if getattr(args, "action", None) is None else f"{args.group}.{args.action}"
+        params = {k: v for k, v in vars(args).items()
+                  if k not in ("db", "group", "action")}
+        params["stream"] = out
+        try:
+            result = COMMANDS[name](crm, params)
+        except (CommandError, SyncError, ValueError, OSError) as e:
+            # ValueError يشمل أخطاء JSON والمدخلات غير الصالحة
+            print(f"خطأ: {e}")
+            return 1
+
+    if name != "export" or params["output"]:
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
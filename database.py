@@ -4,25 +4,157 @@
 
 import sqlite3
 import os
+import atexit
+from contextlib import contextmanager
 from datetime import datetime
 
+from journal import WriteBehindJournal, JournalLockedError
+from normalize import normalize_phone
+from models import ORDER_STATUS_DELIVERED, ORDER_STATUS_CANCELLED, ORDER_STATUS_READY
+
+
+# شروط الفهارس الجزئية: يستخدم SQLite الفهرس الجزئي فقط إذا احتوى الاستعلام
+# على نفس الشرط حرفياً (بقيم ثابتة لا بمعاملات)، لذا تُستخدم في الاستعلامات كما هي.
+# {alias} بادئة الجدول لكل عمود: "" في تعريف الفهرس و"o." في الاستعلامات
+UNPAID_ORDER_PREDICATE = "{alias}total_amount > {alias}paid_amount"
+OPEN_ORDER_PREDICATE = (f"{{alias}}status NOT IN ('{ORDER_STATUS_DELIVERED}', "
+                        f"'{ORDER_STATUS_CANCELLED}')")
+READY_ORDER_PREDICATE = f"{{alias}}status = '{ORDER_STATUS_READY}'"
+
+# إصدار البيانات في PRAGMA user_version: ترقيات تُنفذ مرة واحدة لكل قاعدة
+SCHEMA_VERSION_PHONE_KEYS = 1
+
+# حجم دفعة تعبئة أرقام الهواتف الموحدة
+PHONE_BACKFILL_BATCH = 500
+
+
+class SharedConnection:
+    """
+    اتصال دائم مشترك (لقاعدة في الذاكرة): الإغلاق من المستدعي لا يغلقه فعلياً
+    """
+    
+    def __init__(self, conn):
+        self._conn = conn
+    
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+    
+    def close(self):
+        pass
+
 
 class Database:
-    def __init__(self, db_path="tailor_crm.db"):
+    def __init__(self, db_path="tailor_crm.db", engine="disk",
+                 flush_interval=1.0, flush_batch=500):
         """
         تهيئة قاعدة البيانات
+        
+        engine="memory": تحميل القاعدة كاملة في الذاكرة وخدمة القراءة منها،
+        مع تسجيل الكتابة في سجل وتطبيقها على الملف في الخلفية كل
+        flush_interval ثانية على الأكثر. المسار ":memory:" يعمل دائماً
+        كقاعدة واحدة دائمة في الذاكرة.
         """
         self.db_path = db_path
+        self.engine = engine
+        self._transaction = None  # اتصال المعاملة المفتوحة حالياً إن وجدت
+        self._shared = None       # الاتصال الدائم في وضع الذاكرة
+        self._journal = None
+        
+        if db_path == ":memory:":
+            self._shared = self._open_memory()
+        elif engine == "memory":
+            # استعادة ما لم يُكتب من الجلسة السابقة قبل أي شيء آخر
+            self._journal = WriteBehindJournal(db_path, flush_interval, flush_batch)
+        elif engine != "disk":
+            raise ValueError(f"محرك غير معروف: {engine}")
+        elif os.path.exists(WriteBehindJournal.journal_path(db_path)):
+            # سجل متبقٍ من جلسة ذاكرة تعطلت: يُطبق قبل العمل على القرص مباشرة.
+            # إذا كانت جلسة الذاكرة حية فهي تحتفظ بالقفل وتكتب سجلها بنفسها
+            try:
+                WriteBehindJournal(db_path).close()
+            except JournalLockedError:
+                pass
+        
         self.init_database()
+        
+        if self._journal is not None:
+            memory = self._open_memory()
+            disk = sqlite3.connect(self.db_path)
+            try:
+                disk.backup(memory)
+            finally:
+                disk.close()
+            self._shared = memory
+            self._journal.start()
+            atexit.register(self.close)
+    
+    @staticmethod
+    def _open_memory():
+        conn = sqlite3.connect(":memory:")
+        conn.row_factory = sqlite3.Row
+        return conn
     
     def get_connection(self):
         """
         إنشاء اتصال بقاعدة البيانات
         """
+        if self._shared is not None:
+            return SharedConnection(self._shared)
         conn = sqlite3.connect(self.db_path)
         conn.row_factory = sqlite3.Row  # للحصول على النتائج كقاموس
         return conn
     
+    def flush(self):
+        """
+        كتابة التغييرات المعلقة على الملف فوراً (في وضع الذاكرة)
+        """
+        if self._journal is not None:
+            self._journal.flush()
+    
+    def close(self):
+        """
+        إغلاق قاعدة البيانات وكتابة كل التغييرات المعلقة على الملف
+        """
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+            atexit.unregister(self.close)
+        if self._shared is not None and self.db_path != ":memory:":
+            self._shared.close()
+            self._shared = None
+    
+    def _record_write(self, conn, query, params, changes_before, many=False):
+        """
+        تسجيل جملة كتابة ناجحة في سجل وضع الذاكرة
+        """
+        if self._journal is None:
+            return
+        changed = conn.total_changes != changes_before
+        if self._journal.is_write(query, changed):
+            self._journal.record(query, params, many)
+            if self._transaction is None:
+                self._journal.commit()
+    
+    @staticmethod
+    def _backfill_phone_keys(cursor, batch_size=PHONE_BACKFILL_BATCH):
+        """
+        تعبئة رقم الهاتف الموحد للعملاء القدامى على دفعات (ترقية لمرة واحدة).
+        الأرقام المكررة تبقى فارغة حتى يتم دمج العملاء المكررين
+        """
+        last_id = 0
+        while True:
+            rows = cursor.execute('''
+                SELECT id, phone FROM customers
+                WHERE phone_key IS NULL AND id > ?
+                ORDER BY id LIMIT ?
+            ''', (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            
+            params = [(key, row[0]) for row in rows if (key := normalize_phone(row[1]))]
+            cursor.executemany("UPDATE OR IGNORE customers SET phone_key = ? WHERE id = ?", params)
+    
     def init_database(self):
         """
         إنشاء جداول قاعدة البيانات إذا لم تكن موجودة
@@ -30,12 +162,16 @@ class Database:
         conn = self.get_connection()
         cursor = conn.cursor()
         
+        # للقواعد الجديدة فقط (قبل إنشاء أي جدول)، والقديمة تُحوّل في الصيانة
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        
         # جدول العملاء
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS customers (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 name TEXT NOT NULL,
                 phone TEXT UNIQUE,
+                phone_key TEXT,
                 address TEXT,
                 email TEXT,
                 created_at TEXT DEFAULT CURRENT_TIMESTAMP,
@@ -114,16 +250,80 @@ class Database:
             )
         ''')
         
+        # ترقية القواعد القديمة: عمود رقم الهاتف الموحد وفهرسه الفريد
+        columns = [row[1] for row in cursor.execute("PRAGMA table_info(customers)")]
+        if "phone_key" not in columns:
+            cursor.execute("ALTER TABLE customers ADD COLUMN phone_key TEXT")
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_customers_phone_key ON customers (phone_key)")
+        if cursor.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION_PHONE_KEYS:
+            self._backfill_phone_keys(cursor)
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION_PHONE_KEYS}")
+        
+        # فهارس المفاتيح الأجنبية لقراءة ملف العميل وطلباته دون مسح كامل للجداول
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_customer ON orders (customer_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_measurements_customer ON measurements (customer_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_appointments_customer ON appointments (customer_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_payments_order ON payments (order_id)")
+        
+        # فهارس نطاقات التواريخ للتذكيرات، وفهرس جزئي للطلبات غير المسددة فقط
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_delivery ON orders (delivery_date)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_appointments_date ON appointments (date, time)")
+        cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_orders_unpaid_delivery ON orders (delivery_date)
+            WHERE {UNPAID_ORDER_PREDICATE.format(alias='')}
+        ''')
+        
+        # فهارس جزئية للطلبات المفتوحة والجاهزة: حجمها يتبع عدد الطلبات الحالية لا السجل كله
+        cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_orders_open_delivery ON orders (delivery_date)
+            WHERE {OPEN_ORDER_PREDICATE.format(alias='')}
+        ''')
+        cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_orders_ready ON orders (delivery_date)
+            WHERE {READY_ORDER_PREDICATE.format(alias='')}
+        ''')
+        
         conn.commit()
         conn.close()
         print("تم إنشاء قاعدة البيانات بنجاح!")
     
+    @contextmanager
+    def transaction(self):
+        """
+        تنفيذ عدة استعلامات داخل معاملة واحدة على اتصال واحد
+        
+        تستخدم execute_query و execute_insert اتصال المعاملة تلقائياً،
+        وأي خطأ داخلها يلغي المعاملة كاملة.
+        """
+        if self._transaction is not None:
+            # معاملة متداخلة: تُنفذ ضمن المعاملة الخارجية
+            yield self._transaction
+            return
+        
+        conn = self.get_connection()
+        self._transaction = conn
+        try:
+            yield conn
+            conn.commit()
+            if self._journal is not None:
+                self._journal.commit()
+        except Exception:
+            conn.rollback()
+            if self._journal is not None:
+                self._journal.discard()
+            raise
+        finally:
+            self._transaction = None
+            conn.close()
+    
     def execute_query(self, query, params=None):
         """
         تنفيذ استعلام SQL
         """
-        conn = self.get_connection()
+        in_transaction = self._transaction is not None
+        conn = self._transaction if in_transaction else self.get_connection()
         cursor = conn.cursor()
+        changes_before = conn.total_changes
         
         try:
             if params:
@@ -131,20 +331,27 @@ class Database:
             else:
                 cursor.execute(query)
             
-            conn.commit()
+            if not in_transaction:
+                conn.commit()
+            self._record_write(conn, query, params, changes_before)
             return cursor.fetchall()
         except sqlite3.Error as e:
+            if in_transaction:
+                raise
             print(f"خطأ في قاعدة البيانات: {e}")
             return None
         finally:
-            conn.close()
+            if not in_transaction:
+                conn.close()
     
     def execute_insert(self, query, params=None):
         """
         تنفيذ استعلام إدراج وإرجاع ID الصف الجديد
         """
-        conn = self.get_connection()
+        in_transaction = self._transaction is not None
+        conn = self._transaction if in_transaction else self.get_connection()
         cursor = conn.cursor()
+        changes_before = conn.total_changes
         
         try:
             if params:
@@ -152,13 +359,44 @@ class Database:
             else:
                 cursor.execute(query)
             
-            conn.commit()
+            if not in_transaction:
+                conn.commit()
+            self._record_write(conn, query, params, changes_before)
             return cursor.lastrowid
         except sqlite3.Error as e:
+            if in_transaction:
+                raise
             print(f"خطأ في قاعدة البيانات: {e}")
             return None
         finally:
-            conn.close()
+            if not in_transaction:
+                conn.close()
+    
+    def execute_many(self, query, params_list):
+        """
+        تنفيذ نفس الاستعلام لعدة مجموعات من المعاملات وإرجاع عدد الصفوف المتأثرة
+        """
+        in_transaction = self._transaction is not None
+        conn = self._transaction if in_transaction else self.get_connection()
+        cursor = conn.cursor()
+        changes_before = conn.total_changes
+        params_list = list(params_list)
+        
+        try:
+            cursor.executemany(query, params_list)
+            
+            if not in_transaction:
+                conn.commit()
+            self._record_write(conn, query, params_list, changes_before, many=True)
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            if in_transaction:
+                raise
+            print(f"خطأ في قاعدة البيانات: {e}")
+            return None
+        finally:
+            if not in_transaction:
+                conn.close()
     
     def get_current_timestamp(self):
         """
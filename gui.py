@@ -9,12 +9,242 @@ from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                             QTextEdit, QComboBox, QDateEdit, QTimeEdit,
                             QDialog, QFormLayout, QDialogButtonBox, 
                             QMessageBox, QHeaderView, QSpinBox, QDoubleSpinBox,
-                            QGroupBox, QGridLayout, QFrame, QSplitter)
-from PyQt6.QtCore import Qt, QDate, QTime, pyqtSignal
-from PyQt6.QtGui import QFont, QIcon, QPalette, QColor
+                            QGroupBox, QGridLayout, QFrame, QSplitter,
+                            QInputDialog, QCheckBox, QFileDialog)
+from PyQt6.QtCore import Qt, QDate, QTime, QTimer, QEvent, QUrl, pyqtSignal
+from PyQt6.QtGui import QFont, QIcon, QPalette, QColor, QDesktopServices
 from logic import CRMLogic
-from models import Customer, Order, Measurement, Appointment, Payment
+from reminders import ReminderScheduler
+from maintenance import DatabaseMaintenance, MAINTENANCE_IDLE_SECONDS
+from invoices import InvoiceRenderer, write_document
+from models import (Customer, Order, Measurement, Appointment, Payment,
+                    ORDER_STATUSES, APPOINTMENT_STATUSES)
 from datetime import datetime
+import os
+import tempfile
+import time
+
+
+class CustomerProfileDialog(QDialog):
+    """نافذة ملف العميل الكامل (تُحمَّل باستعلام واحد)"""
+    
+    def __init__(self, profile, parent=None):
+        super().__init__(parent)
+        self.profile = profile
+        self.setWindowTitle(f"ملف العميل - {profile['customer'].name}")
+        self.setLayoutDirection(Qt.LayoutDirection.RightToLeft)
+        self.resize(900, 650)
+        self.init_ui()
+    
+    def init_ui(self):
+        """تهيئة واجهة ملف العميل"""
+        customer = self.profile['customer']
+        totals = self.profile['totals']
+        layout = QVBoxLayout()
+        
+        # بيانات العميل
+        info_group = QGroupBox("بيانات العميل")
+        info_layout = QFormLayout()
+        info_layout.addRow("الاسم:", QLabel(customer.name))
+        info_layout.addRow("رقم الهاتف:", QLabel(customer.phone or ""))
+        info_layout.addRow("العنوان:", QLabel(customer.address or ""))
+        info_layout.addRow("البريد الإلكتروني:", QLabel(customer.email or ""))
+        info_group.setLayout(info_layout)
+        
+        # الإجماليات
+        totals_group = QGroupBox("الإجماليات")
+        totals_layout = QFormLayout()
+        totals_layout.addRow("عدد الطلبات:", QLabel(str(totals['orders_count'])))
+        totals_layout.addRow("الطلبات المفتوحة:", QLabel(str(totals['open_orders'])))
+        totals_layout.addRow("إجمالي المبالغ:", QLabel(f"{totals['total_amount']:.2f} ريال"))
+        totals_layout.addRow("إجمالي المدفوع:", QLabel(f"{totals['paid_amount']:.2f} ريال"))
+        totals_layout.addRow("إجمالي المتبقي:", QLabel(f"{totals['remaining_amount']:.2f} ريال"))
+        totals_group.setLayout(totals_layout)
+        
+        top_layout = QHBoxLayout()
+        top_layout.addWidget(info_group)
+        top_layout.addWidget(totals_group)
+        layout.addLayout(top_layout)
+        
+        # الطلبات
+        orders_group = QGroupBox("الطلبات")
+        orders_layout = QVBoxLayout()
+        orders_table = self.create_table(
+            ["نوع الطلب", "الحالة", "تاريخ الطلب", "تاريخ التسليم",
+             "المبلغ الإجمالي", "المبلغ المدفوع", "المبلغ المتبقي"],
+            [[o['order_type'], o['status'], o['order_date'] or "", o['delivery_date'] or "",
+              f"{o['total_amount']:.2f}", f"{o['paid_amount']:.2f}",
+              f"{o['remaining_amount']:.2f}"]
+             for o in self.profile['orders']])
+        orders_layout.addWidget(orders_table)
+        orders_group.setLayout(orders_layout)
+        layout.addWidget(orders_group)
+        
+        # آخر القياسات والمواعيد القادمة
+        bottom_layout = QHBoxLayout()
+        
+        measurements_group = QGroupBox("آخر القياسات")
+        measurements_layout = QVBoxLayout()
+        measurements_table = self.create_table(
+            ["الطول", "عرض الكتف", "طول الكم", "عرض الصدر", "تاريخ القياس"],
+            [[self.format_value(m.height), self.format_value(m.shoulder_width),
+              self.format_value(m.sleeve_length), self.format_value(m.chest_width),
+              m.created_at or ""]
+             for m in self.profile['measurements']])
+        measurements_layout.addWidget(measurements_table)
+        measurements_group.setLayout(measurements_layout)
+        
+        appointments_group = QGroupBox("المواعيد القادمة")
+        appointments_layout = QVBoxLayout()
+        appointments_table = self.create_table(
+            ["التاريخ", "الوقت", "الغرض"],
+            [[a.date, a.time, a.purpose] for a in self.profile['appointments']])
+        appointments_layout.addWidget(appointments_table)
+        appointments_group.setLayout(appointments_layout)
+        
+        bottom_layout.addWidget(measurements_group)
+        bottom_layout.addWidget(appointments_group)
+        layout.addLayout(bottom_layout)
+        
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Close)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+        
+        self.setLayout(layout)
+    
+    def create_table(self, headers, rows):
+        """إنشاء جدول للقراءة فقط"""
+        table = QTableWidget(len(rows), len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                table.setItem(row, column, QTableWidgetItem(value))
+        return table
+    
+    @staticmethod
+    def format_value(value):
+        """تنسيق قيمة قياس قد تكون فارغة"""
+        return "" if value is None else f"{value:g}"
+
+
+class DuplicateCustomersDialog(QDialog):
+    """نافذة اكتشاف العملاء المكررين ودمجهم"""
+    
+    REASONS = {'phone': "رقم الهاتف", 'name': "الاسم"}
+    
+    def __init__(self, crm, parent=None):
+        super().__init__(parent)
+        self.crm = crm
+        self.groups = []
+        self.merged = False
+        self.setWindowTitle("العملاء المكررون")
+        self.setLayoutDirection(Qt.LayoutDirection.RightToLeft)
+        self.resize(800, 500)
+        self.init_ui()
+        self.load_groups()
+    
+    def init_ui(self):
+        """تهيئة واجهة النافذة"""
+        layout = QVBoxLayout()
+        
+        hint = QLabel("حدد عميلين أو أكثر من نفس المجموعة لدمجهم في أقدم سجل بينهم. "
+                      "دمج المجموعة كاملة متاح فقط عند تطابق الهاتف أو العنوان أو البريد")
+        hint.setWordWrap(True)
+        layout.addWidget(hint)
+        
+        self.table = QTableWidget()
+        self.table.setColumnCount(5)
+        self.table.setHorizontalHeaderLabels(["المجموعة", "السبب", "ID", "الاسم", "رقم الهاتف"])
+        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QTableWidget.SelectionMode.ExtendedSelection)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.table.itemSelectionChanged.connect(self.update_buttons)
+        layout.addWidget(self.table)
+        
+        buttons_layout = QHBoxLayout()
+        merge_selected_btn = QPushButton("دمج المحددين")
+        merge_selected_btn.clicked.connect(self.merge_selected_customers)
+        self.merge_group_btn = QPushButton("دمج المجموعة كاملة")
+        self.merge_group_btn.clicked.connect(self.merge_selected_group)
+        self.merge_group_btn.setEnabled(False)
+        close_btn = QPushButton("إغلاق")
+        close_btn.clicked.connect(self.accept)
+        buttons_layout.addWidget(merge_selected_btn)
+        buttons_layout.addWidget(self.merge_group_btn)
+        buttons_layout.addStretch()
+        buttons_layout.addWidget(close_btn)
+        layout.addLayout(buttons_layout)
+        
+        self.setLayout(layout)
+    
+    def load_groups(self):
+        """تحميل مجموعات التكرار"""
+        self.groups = self.crm.find_duplicate_customers()
+        rows = [(index, group['reason'], customer)
+                for index, group in enumerate(self.groups)
+                for customer in group['customers']]
+        
+        self.table.setRowCount(len(rows))
+        for row, (index, reason, customer) in enumerate(rows):
+            values = [str(index + 1), self.REASONS[reason], str(customer.id),
+                      customer.name, customer.phone or ""]
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+    
+    def selected_rows(self):
+        """أرقام الصفوف المحددة"""
+        return sorted(index.row() for index in self.table.selectionModel().selectedRows())
+    
+    def current_group(self):
+        """مجموعة الصف الحالي"""
+        current_row = self.table.currentRow()
+        if current_row < 0:
+            return None
+        return self.groups[int(self.table.item(current_row, 0).text()) - 1]
+    
+    def update_buttons(self):
+        """تفعيل دمج المجموعة كاملة للمجموعات المؤكدة فقط"""
+        group = self.current_group()
+        self.merge_group_btn.setEnabled(bool(group and group['confirmed']))
+    
+    def merge_selected_customers(self):
+        """دمج العملاء المحددين فقط"""
+        rows = self.selected_rows()
+        groups = {self.table.item(row, 0).text() for row in rows}
+        if len(rows) < 2 or len(groups) != 1:
+            QMessageBox.warning(self, "تحذير", "يرجى تحديد عميلين أو أكثر من نفس المجموعة")
+            return
+        
+        ids = sorted(int(self.table.item(row, 2).text()) for row in rows)
+        names = "، ".join(self.table.item(row, 3).text() for row in rows)
+        self.merge(ids, names)
+    
+    def merge_selected_group(self):
+        """دمج مجموعة العميل المحدد كاملة (للمجموعات المؤكدة فقط)"""
+        group = self.current_group()
+        if group is None or not group['confirmed']:
+            QMessageBox.warning(self, "تحذير", "يرجى اختيار عميل من مجموعة مؤكدة")
+            return
+        
+        ids = sorted(customer.id for customer in group['customers'])
+        names = "، ".join(customer.name for customer in group['customers'])
+        self.merge(ids, names)
+    
+    def merge(self, ids, names):
+        """تأكيد ودمج العملاء في أقدم سجل بينهم"""
+        reply = QMessageBox.question(self, "تأكيد الدمج",
+                                     f"هل تريد دمج العملاء ({names}) في سجل واحد؟")
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+        
+        if self.crm.merge_customers(ids[0], ids[1:]):
+            self.merged = True
+            self.load_groups()
+        else:
+            QMessageBox.critical(self, "خطأ", "تعذر دمج العملاء")
 
 
 class MainWindow(QMainWindow):
@@ -23,8 +253,24 @@ class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.crm = CRMLogic()
+        self.reminders = ReminderScheduler(self.crm)
+        self.invoices = InvoiceRenderer(self.crm)
         self.init_ui()
         self.load_data()
+        
+        # فحص التذكيرات المستحقة كل دقيقة (من الكومة في الذاكرة دون استعلام)
+        self.reminders_timer = QTimer(self)
+        self.reminders_timer.timeout.connect(self.check_reminders)
+        self.reminders_timer.start(60 * 1000)
+        self.check_reminders()
+        
+        # صيانة القاعدة على خطوات قصيرة بعد فترة خمول من المستخدم
+        self.maintenance = DatabaseMaintenance(self.crm.db)
+        self.last_activity = time.monotonic()
+        QApplication.instance().installEventFilter(self)
+        self.maintenance_timer = QTimer(self)
+        self.maintenance_timer.timeout.connect(self.run_idle_maintenance)
+        self.maintenance_timer.start(60 * 1000)
     
     def init_ui(self):
         """تهيئة واجهة المستخدم"""
@@ -43,6 +289,7 @@ class MainWindow(QMainWindow):
         self.create_dashboard_tab()
         self.create_customers_tab()
         self.create_orders_tab()
+        self.create_followup_tab()
         self.create_measurements_tab()
         self.create_appointments_tab()
         self.create_payments_tab()
@@ -150,6 +397,27 @@ class MainWindow(QMainWindow):
         appointments_group.setLayout(appointments_layout)
         layout.addWidget(appointments_group)
         
+        # التذكيرات المستحقة
+        reminders_group = QGroupBox("التذكيرات")
+        reminders_layout = QVBoxLayout()
+        
+        self.reminders_table = QTableWidget()
+        self.reminders_table.setColumnCount(6)
+        self.reminders_table.setHorizontalHeaderLabels(
+            ["النوع", "العميل", "رقم الهاتف", "التاريخ", "التفاصيل", "المبلغ"])
+        reminders_layout.addWidget(self.reminders_table)
+        
+        export_worklist_btn = QPushButton("تصدير قائمة عمل اليوم")
+        export_worklist_btn.clicked.connect(self.export_worklist)
+        reminders_layout.addWidget(export_worklist_btn)
+        
+        health_btn = QPushButton("صحة قاعدة البيانات")
+        health_btn.clicked.connect(self.show_database_health)
+        reminders_layout.addWidget(health_btn)
+        
+        reminders_group.setLayout(reminders_layout)
+        layout.addWidget(reminders_group)
+        
         dashboard_widget.setLayout(layout)
         self.tabs.addTab(dashboard_widget, "لوحة التحكم")
     
@@ -207,6 +475,12 @@ class MainWindow(QMainWindow):
         delete_customer_btn.clicked.connect(self.delete_customer)
         delete_customer_btn.setStyleSheet("background-color: #f44336;")
         
+        profile_customer_btn = QPushButton("ملف العميل")
+        profile_customer_btn.clicked.connect(self.show_customer_profile)
+        
+        duplicates_btn = QPushButton("العملاء المكررون")
+        duplicates_btn.clicked.connect(self.show_duplicate_customers)
+        
         search_layout = QHBoxLayout()
         search_label = QLabel("البحث:")
         self.customer_search = QLineEdit()
@@ -219,6 +493,8 @@ class MainWindow(QMainWindow):
         buttons_layout.addWidget(add_customer_btn)
         buttons_layout.addWidget(edit_customer_btn)
         buttons_layout.addWidget(delete_customer_btn)
+        buttons_layout.addWidget(profile_customer_btn)
+        buttons_layout.addWidget(duplicates_btn)
         buttons_layout.addStretch()
         buttons_layout.addLayout(search_layout)
         
@@ -229,6 +505,7 @@ class MainWindow(QMainWindow):
         self.customers_table.setColumnCount(5)
         self.customers_table.setHorizontalHeaderLabels(["ID", "الاسم", "رقم الهاتف", "العنوان", "البريد الإلكتروني"])
         self.customers_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.customers_table.doubleClicked.connect(self.show_customer_profile)
         
         # إخفاء عمود ID
         self.customers_table.setColumnHidden(0, True)
@@ -256,9 +533,32 @@ class MainWindow(QMainWindow):
         delete_order_btn.clicked.connect(self.delete_order)
         delete_order_btn.setStyleSheet("background-color: #f44336;")
         
+        # عمليات جماعية على الطلبات المحددة
+        bulk_status_btn = QPushButton("تغيير حالة المحدد")
+        bulk_status_btn.clicked.connect(self.bulk_order_status_dialog)
+        
+        bulk_reschedule_btn = QPushButton("إعادة جدولة المحدد")
+        bulk_reschedule_btn.clicked.connect(self.bulk_reschedule_orders_dialog)
+        
+        bulk_delete_btn = QPushButton("حذف المحدد")
+        bulk_delete_btn.clicked.connect(self.bulk_delete_orders)
+        bulk_delete_btn.setStyleSheet("background-color: #f44336;")
+        
+        # الفواتير
+        print_invoice_btn = QPushButton("طباعة فاتورة")
+        print_invoice_btn.clicked.connect(self.print_invoice)
+        
+        export_invoices_btn = QPushButton("فواتير المحدد")
+        export_invoices_btn.clicked.connect(self.export_invoices)
+        
         buttons_layout.addWidget(add_order_btn)
         buttons_layout.addWidget(edit_order_btn)
         buttons_layout.addWidget(delete_order_btn)
+        buttons_layout.addWidget(bulk_status_btn)
+        buttons_layout.addWidget(bulk_reschedule_btn)
+        buttons_layout.addWidget(bulk_delete_btn)
+        buttons_layout.addWidget(print_invoice_btn)
+        buttons_layout.addWidget(export_invoices_btn)
         buttons_layout.addStretch()
         
         layout.addLayout(buttons_layout)
@@ -271,6 +571,7 @@ class MainWindow(QMainWindow):
             "المبلغ الإجمالي", "المبلغ المدفوع", "المبلغ المتبقي"
         ])
         self.orders_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.orders_table.setSelectionMode(QTableWidget.SelectionMode.ExtendedSelection)
         
         # إخفاء عمود ID
         self.orders_table.setColumnHidden(0, True)
@@ -280,6 +581,52 @@ class MainWindow(QMainWindow):
         orders_widget.setLayout(layout)
         self.tabs.addTab(orders_widget, "الطلبات")
     
+    def create_followup_tab(self):
+        """إنشاء تبويب متابعة المبالغ المتبقية والطلبات المتأخرة والجاهزة"""
+        followup_widget = QWidget()
+        layout = QVBoxLayout()
+        
+        # اختيار القائمة والترتيب
+        controls_layout = QHBoxLayout()
+        
+        self.followup_view_combo = QComboBox()
+        self.followup_view_combo.addItem("المبالغ المتبقية", "unpaid")
+        self.followup_view_combo.addItem("أرصدة العملاء", "balances")
+        self.followup_view_combo.addItem("الطلبات المتأخرة", "overdue")
+        self.followup_view_combo.addItem("جاهز للاستلام", "ready")
+        self.followup_view_combo.currentIndexChanged.connect(self.load_followup)
+        
+        self.followup_sort_combo = QComboBox()
+        self.followup_sort_combo.addItem("حسب المبلغ المتبقي", "amount")
+        self.followup_sort_combo.addItem("حسب أيام التأخير", "days")
+        self.followup_sort_combo.currentIndexChanged.connect(self.load_followup)
+        
+        refresh_btn = QPushButton("تحديث")
+        refresh_btn.clicked.connect(self.load_followup)
+        
+        controls_layout.addWidget(QLabel("القائمة:"))
+        controls_layout.addWidget(self.followup_view_combo)
+        controls_layout.addWidget(QLabel("الترتيب:"))
+        controls_layout.addWidget(self.followup_sort_combo)
+        controls_layout.addWidget(refresh_btn)
+        controls_layout.addStretch()
+        
+        layout.addLayout(controls_layout)
+        
+        self.followup_total_label = QLabel()
+        layout.addWidget(self.followup_total_label)
+        
+        self.followup_table = QTableWidget()
+        self.followup_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        layout.addWidget(self.followup_table)
+        
+        followup_widget.setLayout(layout)
+        self.followup_widget = followup_widget
+        self.tabs.addTab(followup_widget, "المتابعة")
+        
+        # تحديث القائمة عند فتح التبويب
+        self.tabs.currentChanged.connect(self.on_tab_changed)
+    
     def create_measurements_tab(self):
         """إنشاء تبويب القياسات"""
         measurements_widget = QWidget()
@@ -323,7 +670,21 @@ class MainWindow(QMainWindow):
         add_appointment_btn = QPushButton("إضافة موعد جديد")
         add_appointment_btn.clicked.connect(self.add_appointment_dialog)
         
+        # عمليات جماعية على المواعيد المحددة
+        bulk_status_btn = QPushButton("تغيير حالة المحدد")
+        bulk_status_btn.clicked.connect(self.bulk_appointment_status_dialog)
+        
+        bulk_reschedule_btn = QPushButton("إعادة جدولة المحدد")
+        bulk_reschedule_btn.clicked.connect(self.bulk_reschedule_appointments_dialog)
+        
+        bulk_delete_btn = QPushButton("حذف المحدد")
+        bulk_delete_btn.clicked.connect(self.bulk_delete_appointments)
+        bulk_delete_btn.setStyleSheet("background-color: #f44336;")
+        
         buttons_layout.addWidget(add_appointment_btn)
+        buttons_layout.addWidget(bulk_status_btn)
+        buttons_layout.addWidget(bulk_reschedule_btn)
+        buttons_layout.addWidget(bulk_delete_btn)
         buttons_layout.addStretch()
         
         layout.addLayout(buttons_layout)
@@ -335,6 +696,7 @@ class MainWindow(QMainWindow):
             "ID", "العميل", "التاريخ", "الوقت", "الغرض", "الحالة"
         ])
         self.appointments_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.appointments_table.setSelectionMode(QTableWidget.SelectionMode.ExtendedSelection)
         
         # إخفاء عمود ID
         self.appointments_table.setColumnHidden(0, True)
@@ -344,12 +706,846 @@ class MainWindow(QMainWindow):
         appointments_widget.setLayout(layout)
         self.tabs.addTab(appointments_widget, "المواعيد")
     
+    def show_customer_profile(self):
+        """عرض ملف العميل المحدد"""
+        current_row = self.customers_table.currentRow()
+        if current_row < 0:
+            QMessageBox.warning(self, "تحذير", "يرجى اختيار عميل")
+            return
+        
+        customer_id = int(self.customers_table.item(current_row, 0).text())
+        profile = self.crm.get_customer_profile(customer_id)
+        if profile is None:
+            QMessageBox.critical(self, "خطأ", "تعذر تحميل ملف العميل")
+            return
+        
+        CustomerProfileDialog(profile, self).exec()
+    
+    def show_duplicate_customers(self):
+        """عرض العملاء المكررين ودمجهم"""
+        dialog = DuplicateCustomersDialog(self.crm, self)
+        dialog.exec()
+        if dialog.merged:
+            self.load_data()
+            self.reload_reminders()
+    
+    # ==================== التذكيرات ====================
+    
+    def check_reminders(self):
+        """إضافة التذكيرات التي حان وقتها إلى لوحة التحكم"""
+        due = self.reminders.pop_due()
+        for reminder in due:
+            self.add_reminder_row(reminder)
+        
+        if due:
+            self.statusBar().showMessage(f"لديك {len(due)} تذكير جديد", 10000)
+    
+    def add_reminder_row(self, reminder):
+        """إضافة تذكير إلى جدول التذكيرات في لوحة التحكم"""
+        row = self.reminders_table.rowCount()
+        self.reminders_table.insertRow(row)
+        values = [reminder.title, reminder.customer_name, reminder.phone,
+                  reminder.event_date, reminder.details,
+                  "" if reminder.amount is None else f"{reminder.amount:.2f}"]
+        for column, value in enumerate(values):
+            self.reminders_table.setItem(row, column, QTableWidgetItem(value))
+    
+    def reload_reminders(self):
+        """إعادة بناء جدول التذكيرات الظاهرة (بعد تغيير بيانات العملاء)"""
+        self.reminders_table.setRowCount(0)
+        for reminder in self.reminders.surfaced():
+            self.add_reminder_row(reminder)
+    
+    def export_worklist(self):
+        """تصدير قائمة عمل اليوم إلى ملف CSV"""
+        default_name = f"worklist_{datetime.now().strftime('%Y-%m-%d')}.csv"
+        path, _ = QFileDialog.getSaveFileName(self, "تصدير قائمة العمل", default_name,
+                                              "CSV (*.csv)")
+        if not path:
+            return
+        
+        count = self.reminders.export_worklist(path)
+        QMessageBox.information(self, "تم التصدير", f"تم تصدير {count} بند إلى قائمة العمل")
+    
+    # ==================== المتابعة ====================
+    
+    def on_tab_changed(self, index):
+        """تحديث تبويب المتابعة عند فتحه"""
+        if self.tabs.widget(index) is self.followup_widget:
+            self.load_followup()
+    
+    def load_followup(self):
+        """تحميل قائمة المتابعة المختارة من الاستعلامات المدعومة بالفهارس الجزئية"""
+        view = self.followup_view_combo.currentData()
+        sort = self.followup_sort_combo.currentData()
+        
+        if view == "balances":
+            rows = self.crm.get_customer_balances(sort)
+            headers = ["العميل", "رقم الهاتف", "عدد الطلبات", "المبلغ المتبقي", "أيام التأخير"]
+            keys = ["customer_name", "phone", "orders_count", "remaining_amount", "days_overdue"]
+        else:
+            loaders = {
+                "unpaid": self.crm.get_unpaid_orders,
+                "overdue": self.crm.get_overdue_orders,
+                "ready": self.crm.get_ready_orders,
+            }
+            rows = loaders[view](sort)
+            headers = ["العميل", "رقم الهاتف", "نوع الطلب", "الحالة", "تاريخ التسليم",
+                       "المبلغ المتبقي", "أيام التأخير"]
+            keys = ["customer_name", "phone", "order_type", "status", "delivery_date",
+                    "remaining_amount", "days_overdue"]
+        
+        self.followup_table.clear()
+        self.followup_table.setColumnCount(len(headers))
+        self.followup_table.setHorizontalHeaderLabels(headers)
+        self.followup_table.setRowCount(len(rows))
+        for row, data in enumerate(rows):
+            for column, key in enumerate(keys):
+                value = data.get(key)
+                if key == "remaining_amount":
+                    value = f"{value:.2f}"
+                elif key == "days_overdue":
+                    value = str(value) if value is not None and value > 0 else ""
+                self.followup_table.setItem(row, column, QTableWidgetItem(str(value or "")))
+        
+        total = sum(data["remaining_amount"] for data in rows)
+        self.followup_total_label.setText(f"العدد: {len(rows)}    إجمالي المتبقي: {total:.2f}")
+    
+    # ==================== الفواتير والإيصالات ====================
+    
+    def open_document(self, html, name):
+        """فتح مستند HTML في المتصفح للطباعة"""
+        path = os.path.join(tempfile.gettempdir(), f"{name}.html")
+        write_document(html, path)
+        QDesktopServices.openUrl(QUrl.fromLocalFile(path))
+    
+    def print_invoice(self):
+        """عرض فاتورة الطلب المحدد للطباعة"""
+        order_ids = self.selected_row_ids(self.orders_table)
+        if not order_ids:
+            QMessageBox.warning(self, "تحذير", "يرجى اختيار طلب")
+            return
+        
+        html = self.invoices.invoice_html(order_ids[0])
+        if html:
+            self.open_document(html, f"invoice_{order_ids[0]}")
+    
+    def print_receipt(self, payment_id):
+        """عرض إيصال دفعة للطباعة (من تبويب المدفوعات)"""
+        html = self.invoices.receipt_html(payment_id)
+        if html:
+            self.open_document(html, f"receipt_{payment_id}")
+        else:
+            QMessageBox.warning(self, "خطأ", "الدفعة غير موجودة")
+    
+    def export_invoices(self):
+        """إصدار فواتير الطلبات المحددة إلى مجلد"""
+        order_ids = self.selected_row_ids(self.orders_table)
+        if not order_ids:
+            QMessageBox.warning(self, "تحذير", "يرجى اختيار طلب واحد على الأقل")
+            return
+        
+        output_dir = QFileDialog.getExistingDirectory(self, "اختر مجلد الفواتير")
+        if not output_dir:
+            return
+        
+        try:
+            paths = self.invoices.render_batch(order_ids, output_dir)
+        except Exception as e:
+            QMessageBox.warning(self, "خطأ", f"تعذر إصدار الفواتير: {e}")
+            return
+        QMessageBox.information(self, "تم الإصدار", f"تم إصدار {len(paths)} فاتورة")
+    
+    # ==================== صيانة قاعدة البيانات ====================
+    
+    def eventFilter(self, obj, event):
+        """تسجيل آخر نشاط للمستخدم لتحديد وقت الخمول"""
+        if event.type() in (QEvent.Type.KeyPress, QEvent.Type.MouseButtonPress, QEvent.Type.Wheel):
+            self.last_activity = time.monotonic()
+        return super().eventFilter(obj, event)
+    
+    def run_idle_maintenance(self):
+        """خطوة صيانة محدودة إذا كان المستخدم خاملاً لمدة كافية"""
+        if time.monotonic() - self.last_activity < MAINTENANCE_IDLE_SECONDS:
+            return
+        try:
+            self.maintenance.run_idle_step()
+        except Exception as e:
+            print(f"خطأ في صيانة قاعدة البيانات: {e}")
+    
+    def show_database_health(self):
+        """عرض ملخص صحة قاعدة البيانات"""
+        try:
+            health = self.maintenance.health()
+        except Exception as e:
+            QMessageBox.warning(self, "خطأ", f"تعذر قراءة حالة قاعدة البيانات: {e}")
+            return
+        
+        lines = []
+        if health["file_size"] is not None:
+            lines.append(f"حجم الملف: {health['file_size'] / 1024:.1f} KB")
+        lines.append(f"الصفحات: {health['page_count']} (الحرة: {health['freelist_pages']})")
+        lines.append(f"نسبة الصفحات الحرة: {health['free_ratio']:.1%}")
+        if health["unused_ratio"] is not None:
+            lines.append(f"المساحة غير المستخدمة داخل الصفحات: {health['unused_ratio']:.1%}")
+        lines.append("")
+        lines.extend(f"{table}: {count} صف" for table, count in health["row_counts"].items())
+        if health["index_sizes"]:
+            lines.append("")
+            lines.extend(f"{name}: {size / 1024:.1f} KB"
+                         for name, size in sorted(health["index_sizes"].items()))
+        QMessageBox.information(self, "صحة قاعدة البيانات", "\n".join(lines))
+    
+    def closeEvent(self, event):
+        """صيانة كاملة وكتابة التغييرات المعلقة عند إغلاق البرنامج"""
+        self.statusBar().showMessage("جاري صيانة قاعدة البيانات...")
+        try:
+            self.maintenance.run_full()
+        except Exception as e:
+            print(f"خطأ في صيانة قاعدة البيانات: {e}")
+        self.crm.db.close()
+        super().closeEvent(event)
+    
+    # ==================== العمليات الجماعية ====================
+    
+    def selected_row_ids(self, table):
+        """الحصول على معرفات الصفوف المحددة في جدول (عمود ID المخفي)"""
+        rows = sorted(index.row() for index in table.selectionModel().selectedRows())
+        return [int(table.item(row, 0).text()) for row in rows]
+    
+    def find_table_rows(self, table, ids):
+        """إيجاد أرقام صفوف الجدول المقابلة لمجموعة معرفات دون إعادة التحميل"""
+        ids = set(ids)
+        return {int(table.item(row, 0).text()): row
+                for row in range(table.rowCount())
+                if table.item(row, 0) and int(table.item(row, 0).text()) in ids}
+    
+    def remove_table_rows(self, table, ids):
+        """حذف صفوف محددة من الجدول فقط"""
+        rows = self.find_table_rows(table, ids)
+        for row in sorted(rows.values(), reverse=True):
+            table.removeRow(row)
+    
+    def refresh_order_rows(self, order_ids):
+        """تحديث صفوف الطلبات المتأثرة فقط باستعلام واحد"""
+        rows = self.find_table_rows(self.orders_table, order_ids)
+        for order in self.crm.get_orders_by_ids(list(rows)):
+            row = rows[order['id']]
+            for column, value in enumerate(self.order_row_values(order)):
+                self.orders_table.setItem(row, column, QTableWidgetItem(value))
+    
+    def refresh_appointment_rows(self, appointment_ids):
+        """تحديث صفوف المواعيد المتأثرة فقط باستعلام واحد"""
+        rows = self.find_table_rows(self.appointments_table, appointment_ids)
+        for appointment in self.crm.get_appointments_by_ids(list(rows)):
+            row = rows[appointment['id']]
+            for column, value in enumerate(self.appointment_row_values(appointment)):
+                self.appointments_table.setItem(row, column, QTableWidgetItem(value))
+    
+    def bulk_order_status_dialog(self):
+        """تغيير حالة الطلبات المحددة دفعة واحدة"""
+        order_ids = self.selected_row_ids(self.orders_table)
+        if not order_ids:
+            QMessageBox.warning(self, "تحذير", "يرجى اختيار طلب واحد على الأقل")
+            return
+        
+        status, ok = QInputDialog.getItem(self, "تغيير الحالة",
+                                          f"الحالة الجديدة لـ {len(order_ids)} طلب:",
+                                          ORDER_STATUSES, 0, False)
+        if ok and self.crm.bulk_update_order_status(order_ids, status):
+            self.refresh_order_rows(order_ids)
+    
+    def bulk_reschedule_orders_dialog(self):
+        """تغيير تاريخ تسليم الطلبات المحددة"""
+        order_ids = self.selected_row_ids(self.orders_table)
+        if not order_ids:
+            QMessageBox.warning(self, "تحذير", "يرجى اختيار طلب واحد على الأقل")
+            return
+        
+        dialog = QDialog(self)
+        dialog.setWindowTitle("إعادة جدولة الطلبات")
+        form = QFormLayout()
+        
+        date_edit = QDateEdit(QDate.currentDate().addDays(1))
+        date_edit.setCalendarPopup(True)
+        form.addRow("تاريخ التسليم الجديد:", date_edit)
+        
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok |
+                                   QDialogButtonBox.StandardButton.Cancel)
+        buttons.accepted.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        form.addRow(buttons)
+        dialog.setLayout(form)
+        
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        
+        delivery_date = date_edit.date().toString("yyyy-MM-dd")
+        if self.crm.bulk_reschedule_orders(order_ids, delivery_date):
+            self.refresh_order_rows(order_ids)
+    
+    def bulk_delete_orders(self):
+        """حذف الطلبات المحددة مع مدفوعاتها"""
+        order_ids = self.selected_row_ids(self.orders_table)
+        if not order_ids:
+            QMessageBox.warning(self, "تحذير", "يرجى اختيار طلب واحد على الأقل")
+            return
+        
+        reply = QMessageBox.question(self, "تأكيد الحذف",
+                                     f"هل تريد حذف {len(order_ids)} طلب مع مدفوعاتها؟")
+        if reply == QMessageBox.StandardButton.Yes and self.crm.bulk_delete_orders(order_ids):
+            self.remove_table_rows(self.orders_table, order_ids)
+            # حُذفت مدفوعات الطلبات معها
+            self.load_payments()
+            self.load_dashboard()
+    
+    def bulk_appointment_status_dialog(self):
+        """تغيير حالة المواعيد المحددة دفعة واحدة"""
+        appointment_ids = self.selected_row_ids(self.appointments_table)
+        if not appointment_ids:
+            QMessageBox.warning(self, "تحذير", "يرجى اختيار موعد واحد على الأقل")
+            return
+        
+        status, ok = QInputDialog.getItem(self, "تغيير الحالة",
+                                          f"الحالة الجديدة لـ {len(appointment_ids)} موعد:",
+                                          APPOINTMENT_STATUSES, 0, False)
+        if ok and self.crm.bulk_update_appointment_status(appointment_ids, status):
+            self.refresh_appointment_rows(appointment_ids)
+    
+    def bulk_reschedule_appointments_dialog(self):
+        """إعادة جدولة المواعيد المحددة إلى تاريخ (ووقت) جديد"""
+        appointment_ids = self.selected_row_ids(self.appointments_table)
+        if not appointment_ids:
+            QMessageBox.warning(self, "تحذير", "يرجى اختيار موعد واحد على الأقل")
+            return
+        
+        dialog = QDialog(self)
+        dialog.setWindowTitle("إعادة جدولة المواعيد")
+        form = QFormLayout()
+        
+        date_edit = QDateEdit(QDate.currentDate().addDays(1))
+        date_edit.setCalendarPopup(True)
+        time_edit = QTimeEdit(QTime(10, 0))
+        keep_time = QCheckBox("الإبقاء على الوقت الحالي")
+        keep_time.setChecked(True)
+        time_edit.setEnabled(False)
+        keep_time.toggled.connect(lambda checked: time_edit.setEnabled(not checked))
+        
+        form.addRow("التاريخ الجديد:", date_edit)
+        form.addRow(keep_time)
+        form.addRow("الوقت الجديد:", time_edit)
+        
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok |
+                                   QDialogButtonBox.StandardButton.Cancel)
+        buttons.accepted.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        form.addRow(buttons)
+        dialog.setLayout(form)
+        
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        
+        date = date_edit.date().toString("yyyy-MM-dd")
+        time = None if keep_time.isChecked() else time_edit.time().toString("HH:mm")
+        if self.crm.bulk_reschedule_appointments(appointment_ids, date, time):
+            self.refresh_appointment_rows(appointment_ids)
+    
+    def bulk_delete_appointments(self):
+        """حذف المواعيد المحددة"""
+        appointment_ids = self.selected_row_ids(self.appointments_table)
+        if not appointment_ids:
+            QMessageBox.warning(self, "تحذير", "يرجى اختيار موعد واحد على الأقل")
+            return
+        
+        reply = QMessageBox.question(self, "تأكيد الحذف",
+                                     f"هل تريد حذف {len(appointment_ids)} موعد؟")
+        if reply == QMessageBox.StandardButton.Yes and self.crm.bulk_delete_appointments(appointment_ids):
+            self.remove_table_rows(self.appointments_table, appointment_ids)
+    
     def create_payments_tab(self):
         """إنشاء تبويب المدفوعات"""
         payments_widget = QWidget()
         layout = QVBoxLayout()
-        
+    
         # أزرار التحكم
         buttons_layout = QHBoxLayout()
-        
-        add_payment_btn = QPushB
+    
+        add_payment_btn = QPushButton("إضافة دفعة")
+        add_payment_btn.clicked.connect(self.add_payment_dialog)
+    
+        print_receipt_btn = QPushButton("طباعة إيصال")
+        print_receipt_btn.clicked.connect(self.print_selected_receipt)
+    
+        buttons_layout.addWidget(add_payment_btn)
+        buttons_layout.addWidget(print_receipt_btn)
+        buttons_layout.addStretch()
+    
+        layout.addLayout(buttons_layout)
+    
+        # جدول المدفوعات
+        self.payments_table = QTableWidget()
+        self.payments_table.setColumnCount(6)
+        self.payments_table.setHorizontalHeaderLabels([
+            "ID", "العميل", "الطلب", "المبلغ", "طريقة الدفع", "التاريخ"
+        ])
+        self.payments_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.payments_table.doubleClicked.connect(self.print_selected_receipt)
+    
+        # إخفاء عمود ID
+        self.payments_table.setColumnHidden(0, True)
+    
+        layout.addWidget(self.payments_table)
+    
+        payments_widget.setLayout(layout)
+        self.tabs.addTab(payments_widget, "المدفوعات")
+    
+    # ==================== تحميل البيانات ====================
+    
+    def load_data(self):
+        """تحميل جميع البيانات"""
+        self.load_dashboard()
+        self.load_customers()
+        self.load_orders()
+        self.load_measurements()
+        self.load_appointments()
+        self.load_payments()
+    
+    def fill_table(self, table, rows):
+        """ملء جدول بصفوف من القيم النصية"""
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                table.setItem(row, column, QTableWidgetItem(value))
+    
+    def load_dashboard(self):
+        """تحميل إحصائيات لوحة التحكم ومواعيد اليوم"""
+        report = self.crm.get_report()
+        today = datetime.now().strftime("%Y-%m-%d")
+        appointments = self.crm.get_appointments_by_date(today)
+    
+        self.customers_card.value_label.setText(str(report.get('customers_count', 0)))
+        self.orders_card.value_label.setText(str(report.get('orders_count', 0)))
+        self.revenue_card.value_label.setText(f"{report.get('paid_amount', 0):.2f} ريال")
+        self.appointments_card.value_label.setText(str(len(appointments)))
+    
+        self.fill_table(self.today_appointments_table,
+                        [[a['customer_name'], a['time'], a['purpose'], a['status']]
+                         for a in appointments])
+    
+    def load_customers(self, customers=None):
+        """تحميل جدول العملاء (أو نتائج البحث)"""
+        if customers is None:
+            customers = self.crm.get_all_customers()
+        self.fill_table(self.customers_table,
+                        [[str(c.id), c.name, c.phone or "", c.address or "", c.email or ""]
+                         for c in customers])
+    
+    def load_orders(self):
+        """تحميل جدول الطلبات"""
+        self.fill_table(self.orders_table,
+                        [self.order_row_values(order) for order in self.crm.get_all_orders()])
+    
+    def load_measurements(self):
+        """تحميل جدول القياسات"""
+        format_value = CustomerProfileDialog.format_value
+        self.fill_table(self.measurements_table,
+                        [[str(m['id']), m['customer_name'], format_value(m['height']),
+                          format_value(m['shoulder_width']), format_value(m['sleeve_length']),
+                          format_value(m['chest_width']), m['created_at'] or ""]
+                         for m in self.crm.get_all_measurements()])
+    
+    def load_appointments(self):
+        """تحميل جدول المواعيد"""
+        self.fill_table(self.appointments_table,
+                        [self.appointment_row_values(appointment)
+                         for appointment in self.crm.get_all_appointments()])
+    
+    def load_payments(self):
+        """تحميل جدول المدفوعات"""
+        self.fill_table(self.payments_table,
+                        [[str(p['id']), p['customer_name'], p['order_type'],
+                          f"{p['amount']:.2f}", p['payment_method'] or "",
+                          (p['payment_date'] or "")[:10]]
+                         for p in self.crm.get_all_payments()])
+    
+    @staticmethod
+    def order_row_values(order):
+        """قيم صف طلب في جدول الطلبات"""
+        remaining = order['total_amount'] - order['paid_amount']
+        return [str(order['id']), order['customer_name'], order['order_type'],
+                order['status'], order['order_date'] or "",
+                f"{order['total_amount']:.2f}", f"{order['paid_amount']:.2f}",
+                f"{remaining:.2f}"]
+    
+    @staticmethod
+    def appointment_row_values(appointment):
+        """قيم صف موعد في جدول المواعيد"""
+        return [str(appointment['id']), appointment['customer_name'],
+                appointment['date'], appointment['time'],
+                appointment['purpose'], appointment['status']]
+    
+    # ==================== نوافذ الإدخال ====================
+    
+    def run_form_dialog(self, title, rows):
+        """عرض نافذة نموذج (عنوان، عنصر) وإرجاع True عند الموافقة"""
+        dialog = QDialog(self)
+        dialog.setWindowTitle(title)
+        form = QFormLayout()
+    
+        for label, widget in rows:
+            form.addRow(label, widget)
+    
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok |
+                                   QDialogButtonBox.StandardButton.Cancel)
+        buttons.accepted.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        form.addRow(buttons)
+        dialog.setLayout(form)
+    
+        return dialog.exec() == QDialog.DialogCode.Accepted
+    
+    def create_customer_combo(self, selected_id=None):
+        """قائمة اختيار العملاء (None إذا لم يوجد عملاء)"""
+        customers = self.crm.get_all_customers()
+        if not customers:
+            QMessageBox.warning(self, "تحذير", "يرجى إضافة عميل أولاً")
+            return None
+    
+        combo = QComboBox()
+        for customer in customers:
+            combo.addItem(f"{customer.name} - {customer.phone}", customer.id)
+        if selected_id is not None:
+            combo.setCurrentIndex(max(combo.findData(selected_id), 0))
+        return combo
+    
+    def create_amount_spin(self, value=0.0, maximum=1000000):
+        """حقل إدخال مبلغ أو قياس (0 يعني فارغ)"""
+        spin = QDoubleSpinBox()
+        spin.setRange(0, maximum)
+        spin.setDecimals(2)
+        spin.setValue(value or 0)
+        return spin
+    
+    # ==================== العملاء ====================
+    
+    def customer_dialog(self, customer):
+        """نافذة إدخال بيانات عميل، تُرجع True عند الحفظ"""
+        name_edit = QLineEdit(customer.name)
+        phone_edit = QLineEdit(customer.phone or "")
+        address_edit = QLineEdit(customer.address or "")
+        email_edit = QLineEdit(customer.email or "")
+    
+        title = "تعديل عميل" if customer.id else "إضافة عميل جديد"
+        if not self.run_form_dialog(title, [("الاسم:", name_edit),
+                                            ("رقم الهاتف:", phone_edit),
+                                            ("العنوان:", address_edit),
+                                            ("البريد الإلكتروني:", email_edit)]):
+            return False
+    
+        if not name_edit.text().strip():
+            QMessageBox.warning(self, "تحذير", "يرجى إدخال اسم العميل")
+            return False
+    
+        customer.name = name_edit.text().strip()
+        customer.phone = phone_edit.text().strip()
+        customer.address = address_edit.text().strip()
+        customer.email = email_edit.text().strip()
+        return True
+    
+    def add_customer_dialog(self):
+        """إضافة عميل جديد"""
+        customer = Customer()
+        if not self.customer_dialog(customer):
+            return
+    
+        if self.crm.add_customer(customer) is None:
+            QMessageBox.warning(self, "خطأ", "تعذر إضافة العميل (قد يكون رقم الهاتف مسجلاً)")
+            return
+        self.search_customers(self.customer_search.text())
+        self.load_dashboard()
+    
+    def edit_customer_dialog(self):
+        """تعديل العميل المحدد"""
+        current_row = self.customers_table.currentRow()
+        if current_row < 0:
+            QMessageBox.warning(self, "تحذير", "يرجى اختيار عميل")
+            return
+    
+        customer = self.crm.get_customer_by_id(int(self.customers_table.item(current_row, 0).text()))
+        if customer is None or not self.customer_dialog(customer):
+            return
+    
+        if not self.crm.update_customer(customer):
+            QMessageBox.warning(self, "خطأ", "تعذر تحديث بيانات العميل")
+            return
+        # يظهر اسم العميل في الطلبات والقياسات والمواعيد والمدفوعات والتذكيرات
+        self.load_data()
+        self.reload_reminders()
+    
+    def delete_customer(self):
+        """حذف العميل المحدد"""
+        current_row = self.customers_table.currentRow()
+        if current_row < 0:
+            QMessageBox.warning(self, "تحذير", "يرجى اختيار عميل")
+            return
+    
+        customer_id = int(self.customers_table.item(current_row, 0).text())
+        name = self.customers_table.item(current_row, 1).text()
+        reply = QMessageBox.question(self, "تأكيد الحذف", f"هل تريد حذف العميل {name}؟")
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+    
+        if not self.crm.delete_customer(customer_id):
+            QMessageBox.warning(self, "خطأ", "لا يمكن حذف العميل لوجود طلبات مرتبطة به")
+            return
+        self.remove_table_rows(self.customers_table, [customer_id])
+        self.load_dashboard()
+    
+    def search_customers(self, text):
+        """البحث عن العملاء أثناء الكتابة"""
+        text = text.strip()
+        self.load_customers(self.crm.search_customers(text) if text else None)
+    
+    # ==================== الطلبات ====================
+    
+    def order_dialog(self, order):
+        """نافذة إدخال بيانات طلب، تُرجع True عند الحفظ"""
+        customer_combo = self.create_customer_combo(order.customer_id or None)
+        if customer_combo is None:
+            return False
+    
+        type_edit = QLineEdit(order.order_type)
+        status_combo = QComboBox()
+        status_combo.addItems(ORDER_STATUSES)
+        status_combo.setCurrentText(order.status)
+    
+        # تاريخ التسليم اختياري ويُحفظ NULL إذا لم يُحدد
+        delivery_check = QCheckBox("تحديد تاريخ التسليم")
+        delivery_edit = QDateEdit(QDate.currentDate().addDays(7))
+        delivery_edit.setCalendarPopup(True)
+        if order.delivery_date:
+            delivery_edit.setDate(QDate.fromString(order.delivery_date, "yyyy-MM-dd"))
+        delivery_check.setChecked(bool(order.delivery_date))
+        delivery_edit.setEnabled(delivery_check.isChecked())
+        delivery_check.toggled.connect(delivery_edit.setEnabled)
+    
+        total_spin = self.create_amount_spin(order.total_amount)
+        notes_edit = QTextEdit(order.notes or "")
+    
+        rows = [("العميل:", customer_combo), ("نوع الطلب:", type_edit),
+                ("الحالة:", status_combo), ("", delivery_check),
+                ("تاريخ التسليم:", delivery_edit), ("المبلغ الإجمالي:", total_spin)]
+        # المبلغ المدفوع بعد الإنشاء يتغير بالدفعات فقط
+        paid_spin = None
+        if not order.id:
+            paid_spin = self.create_amount_spin(order.paid_amount)
+            rows.append(("المدفوع مقدماً:", paid_spin))
+        rows.append(("ملاحظات:", notes_edit))
+    
+        title = "تعديل طلب" if order.id else "إضافة طلب جديد"
+        if not self.run_form_dialog(title, rows):
+            return False
+    
+        if not type_edit.text().strip():
+            QMessageBox.warning(self, "تحذير", "يرجى إدخال نوع الطلب")
+            return False
+    
+        order.customer_id = customer_combo.currentData()
+        order.order_type = type_edit.text().strip()
+        order.status = status_combo.currentText()
+        order.delivery_date = (delivery_edit.date().toString("yyyy-MM-dd")
+                               if delivery_check.isChecked() else None)
+        order.total_amount = total_spin.value()
+        if paid_spin is not None:
+            order.paid_amount = paid_spin.value()
+        order.notes = notes_edit.toPlainText().strip()
+        return True
+    
+    def add_order_dialog(self):
+        """إضافة طلب جديد"""
+        order = Order()
+        if not self.order_dialog(order):
+            return
+    
+        if self.crm.add_order(order) is None:
+            QMessageBox.warning(self, "خطأ", "تعذر إضافة الطلب")
+            return
+        self.load_orders()
+        self.load_dashboard()
+    
+    def edit_order_dialog(self):
+        """تعديل الطلب المحدد"""
+        order_ids = self.selected_row_ids(self.orders_table)
+        if not order_ids:
+            QMessageBox.warning(self, "تحذير", "يرجى اختيار طلب")
+            return
+    
+        orders = self.crm.get_orders_by_ids(order_ids[:1])
+        if not orders:
+            return
+        order = Order.from_dict(orders[0])
+        if not self.order_dialog(order):
+            return
+    
+        if not self.crm.update_order(order):
+            QMessageBox.warning(self, "خطأ", "تعذر تحديث الطلب")
+            return
+        self.refresh_order_rows([order.id])
+        self.load_payments()
+    
+    def delete_order(self):
+        """حذف الطلب المحدد مع مدفوعاته"""
+        order_ids = self.selected_row_ids(self.orders_table)
+        if not order_ids:
+            QMessageBox.warning(self, "تحذير", "يرجى اختيار طلب")
+            return
+    
+        reply = QMessageBox.question(self, "تأكيد الحذف", "هل تريد حذف الطلب مع مدفوعاته؟")
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+    
+        if not self.crm.delete_order(order_ids[0]):
+            QMessageBox.warning(self, "خطأ", "تعذر حذف الطلب")
+            return
+        self.remove_table_rows(self.orders_table, order_ids[:1])
+        self.load_payments()
+        self.load_dashboard()
+    
+    # ==================== القياسات والمواعيد ====================
+    
+    def add_measurement_dialog(self):
+        """إضافة قياس جديد"""
+        customer_combo = self.create_customer_combo()
+        if customer_combo is None:
+            return
+    
+        fields = [("height", "الطول:"), ("shoulder_width", "عرض الكتف:"),
+                  ("sleeve_length", "طول الكم:"), ("chest_width", "عرض الصدر:"),
+                  ("waist_width", "عرض الخصر:"), ("neck_size", "مقاس الرقبة:"),
+                  ("arm_circumference", "محيط الذراع:"),
+                  ("thigh_circumference", "محيط الفخذ:")]
+        spins = {name: self.create_amount_spin(maximum=300) for name, _ in fields}
+        notes_edit = QTextEdit()
+    
+        rows = [("العميل:", customer_combo)]
+        rows.extend((label, spins[name]) for name, label in fields)
+        rows.append(("ملاحظات:", notes_edit))
+        if not self.run_form_dialog("إضافة قياس جديد", rows):
+            return
+    
+        measurement = Measurement(customer_id=customer_combo.currentData(),
+                                  notes=notes_edit.toPlainText().strip())
+        for name, spin in spins.items():
+            setattr(measurement, name, spin.value() or None)
+    
+        if self.crm.add_measurement(measurement) is None:
+            QMessageBox.warning(self, "خطأ", "تعذر إضافة القياس")
+            return
+        self.load_measurements()
+    
+    def add_appointment_dialog(self):
+        """إضافة موعد جديد"""
+        customer_combo = self.create_customer_combo()
+        if customer_combo is None:
+            return
+    
+        date_edit = QDateEdit(QDate.currentDate())
+        date_edit.setCalendarPopup(True)
+        time_edit = QTimeEdit(QTime(10, 0))
+        purpose_edit = QLineEdit()
+        status_combo = QComboBox()
+        status_combo.addItems(APPOINTMENT_STATUSES)
+        notes_edit = QTextEdit()
+    
+        if not self.run_form_dialog("إضافة موعد جديد", [("العميل:", customer_combo),
+                                                         ("التاريخ:", date_edit),
+                                                         ("الوقت:", time_edit),
+                                                         ("الغرض:", purpose_edit),
+                                                         ("الحالة:", status_combo),
+                                                         ("ملاحظات:", notes_edit)]):
+            return
+    
+        appointment = Appointment(customer_id=customer_combo.currentData(),
+                                  date=date_edit.date().toString("yyyy-MM-dd"),
+                                  time=time_edit.time().toString("HH:mm"),
+                                  purpose=purpose_edit.text().strip(),
+                                  status=status_combo.currentText(),
+                                  notes=notes_edit.toPlainText().strip())
+        if self.crm.add_appointment(appointment) is None:
+            QMessageBox.warning(self, "خطأ", "تعذر إضافة الموعد")
+            return
+        self.load_appointments()
+        self.load_dashboard()
+    
+    # ==================== المدفوعات ====================
+    
+    def add_payment_dialog(self):
+        """إضافة دفعة لطلب (الطلب المحدد في تبويب الطلبات افتراضياً)"""
+        orders = self.crm.get_all_orders()
+        if not orders:
+            QMessageBox.warning(self, "تحذير", "يرجى إضافة طلب أولاً")
+            return
+    
+        order_combo = QComboBox()
+        for order in orders:
+            remaining = order['total_amount'] - order['paid_amount']
+            order_combo.addItem(f"{order['customer_name']} - {order['order_type']} "
+                                f"(المتبقي {remaining:.2f})", order['id'])
+        selected = self.selected_row_ids(self.orders_table)
+        if selected:
+            order_combo.setCurrentIndex(max(order_combo.findData(selected[0]), 0))
+    
+        amount_spin = self.create_amount_spin()
+        method_combo = QComboBox()
+        method_combo.setEditable(True)
+        method_combo.addItems(["نقداً", "تحويل بنكي", "بطاقة"])
+        notes_edit = QLineEdit()
+    
+        if not self.run_form_dialog("إضافة دفعة", [("الطلب:", order_combo),
+                                                    ("المبلغ:", amount_spin),
+                                                    ("طريقة الدفع:", method_combo),
+                                                    ("ملاحظات:", notes_edit)]):
+            return
+    
+        if amount_spin.value() <= 0:
+            QMessageBox.warning(self, "تحذير", "يرجى إدخال مبلغ الدفعة")
+            return
+    
+        payment = Payment(order_id=order_combo.currentData(), amount=amount_spin.value(),
+                          payment_method=method_combo.currentText().strip() or "نقداً",
+                          notes=notes_edit.text().strip())
+        payment_id = self.crm.add_payment(payment)
+        if payment_id is None:
+            QMessageBox.warning(self, "خطأ", "تعذر إضافة الدفعة")
+            return
+    
+        self.load_payments()
+        self.refresh_order_rows([payment.order_id])
+        self.load_dashboard()
+    
+        reply = QMessageBox.question(self, "تمت الإضافة", "هل تريد طباعة إيصال الدفعة؟")
+        if reply == QMessageBox.StandardButton.Yes:
+            self.print_receipt(payment_id)
+    
+    def print_selected_receipt(self):
+        """طباعة إيصال الدفعة المحددة"""
+        payment_ids = self.selected_row_ids(self.payments_table)
+        if not payment_ids:
+            QMessageBox.warning(self, "تحذير", "يرجى اختيار دفعة")
+            return
+        self.print_receipt(payment_ids[0])
+
+
+def main():
+    """تشغيل الواجهة الرسومية"""
+    app = QApplication(sys.argv)
+    app.setLayoutDirection(Qt.LayoutDirection.RightToLeft)
+
+    window = MainWindow()
+    window.show()
+
+    return app.exec()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
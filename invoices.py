@@ -0,0 +1,314 @@
+"""
+إصدار الفواتير والإيصالات لنظام CRM محل الخياطة
+
+تُولد الفواتير بصيغة HTML عربية من اليمين إلى اليسار من قوالب مجمعة
+ومخزنة مؤقتاً، وتُحول إلى PDF إذا توفر محول محلي (wkhtmltopdf أو
+weasyprint). في الإصدار الجماعي تُجلب بيانات كل الفواتير باستعلامات
+مجمعة ثم تُوزع الكتابة على مجموعة عمليات (ProcessPoolExecutor).
+"""
+
+import json
+import os
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from html import escape
+from string import Template
+from typing import Dict, List, Optional
+
+
+# اسم المحل في رأس الفاتورة
+SHOP_NAME = "محل الخياطة الرجالية"
+
+# عدد الطلبات في كل استعلام جلب مجمع
+INVOICE_FETCH_BATCH = 500
+
+# أقل عدد من الفواتير يستحق تشغيل مجموعة العمليات
+PROCESS_POOL_THRESHOLD = 20
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="ar" dir="rtl">
+<head>
+<meta charset="utf-8">
+<title>$title</title>
+<style>
+  body { font-family: "Arial", "Tahoma", sans-serif; direction: rtl; margin: 24px; color: #222; }
+  h1 { margin: 0; font-size: 22px; }
+  .header { display: flex; justify-content: space-between; border-bottom: 2px solid #333; padding-bottom: 8px; }
+  .info td { padding: 2px 8px; }
+  table.items { width: 100%; border-collapse: collapse; margin-top: 16px; }
+  table.items th, table.items td { border: 1px solid #999; padding: 6px; text-align: right; }
+  table.items th { background: #eee; }
+  .totals { margin-top: 16px; width: 40%; }
+  .totals td { padding: 4px 8px; }
+  .totals .due { font-weight: bold; font-size: 16px; }
+  @media print { body { margin: 0; } }
+</style>
+</head>
+<body>
+$body
+</body>
+</html>
+"""
+
+INVOICE_BODY = """<div class="header">
+  <h1>$shop_name</h1>
+  <div>فاتورة رقم: <b>$number</b><br>التاريخ: $order_date</div>
+</div>
+<table class="info">
+  <tr><td>العميل:</td><td>$customer_name</td></tr>
+  <tr><td>رقم الهاتف:</td><td>$phone</td></tr>
+  <tr><td>العنوان:</td><td>$address</td></tr>
+  <tr><td>تاريخ التسليم:</td><td>$delivery_date</td></tr>
+  <tr><td>الحالة:</td><td>$status</td></tr>
+</table>
+<table class="items">
+  <tr><th>البيان</th><th>ملاحظات</th><th>المبلغ</th></tr>
+  <tr><td>$order_type</td><td>$notes</td><td>$total_amount</td></tr>
+</table>
+<table class="items">
+  <tr><th>تاريخ الدفعة</th><th>طريقة الدفع</th><th>المبلغ</th></tr>
+$payment_rows
+</table>
+<table class="totals">
+  <tr><td>الإجمالي:</td><td>$total_amount</td></tr>
+  <tr><td>المدفوع:</td><td>$paid_amount</td></tr>
+  <tr class="due"><td>المتبقي:</td><td>$remaining_amount</td></tr>
+</table>
+"""
+
+PAYMENT_ROW = "  <tr><td>$payment_date</td><td>$payment_method</td><td>$amount</td></tr>"
+
+RECEIPT_BODY = """<div class="header">
+  <h1>$shop_name</h1>
+  <div>إيصال رقم: <b>$number</b><br>التاريخ: $payment_date</div>
+</div>
+<table class="info">
+  <tr><td>استلمنا من:</td><td>$customer_name</td></tr>
+  <tr><td>رقم الهاتف:</td><td>$phone</td></tr>
+  <tr><td>مبلغ:</td><td><b>$amount</b></td></tr>
+  <tr><td>طريقة الدفع:</td><td>$payment_method</td></tr>
+  <tr><td>عن طلب:</td><td>$order_type ($order_number)</td></tr>
+  <tr><td>ملاحظات:</td><td>$notes</td></tr>
+</table>
+<table class="totals">
+  <tr><td>إجمالي الطلب:</td><td>$total_amount</td></tr>
+  <tr><td>المدفوع حتى الآن:</td><td>$paid_amount</td></tr>
+  <tr class="due"><td>المتبقي:</td><td>$remaining_amount</td></tr>
+</table>
+"""
+
+TEMPLATES = {
+    "page": PAGE_TEMPLATE,
+    "invoice": INVOICE_BODY,
+    "payment_row": PAYMENT_ROW,
+    "receipt": RECEIPT_BODY,
+}
+
+
+# ==================== القوالب ====================
+
+@lru_cache(maxsize=None)
+def get_template(name: str) -> Template:
+    """القالب المجمع (يُبنى مرة واحدة في كل عملية)"""
+    return Template(TEMPLATES[name])
+
+
+def _money(value) -> str:
+    return f"{value or 0:,.2f}"
+
+
+def _text(value) -> str:
+    return escape(str(value)) if value else "-"
+
+
+def _page(title: str, body: str) -> str:
+    return get_template("page").substitute(title=escape(title), body=body)
+
+
+def invoice_number(order_id: int) -> str:
+    """رقم الفاتورة المعروض"""
+    return f"INV-{order_id:06d}"
+
+
+def receipt_number(payment_id: int) -> str:
+    """رقم الإيصال المعروض"""
+    return f"RCPT-{payment_id:06d}"
+
+
+def render_invoice(data: dict) -> str:
+    """إنشاء HTML فاتورة طلب من بياناته المجلوبة مسبقاً"""
+    row_template = get_template("payment_row")
+    payment_rows = "\n".join(
+        row_template.substitute(payment_date=_text((p["payment_date"] or "")[:10]),
+                                payment_method=_text(p["payment_method"]),
+                                amount=_money(p["amount"]))
+        for p in data["payments"])
+
+    number = invoice_number(data["id"])
+    body = get_template("invoice").substitute(
+        shop_name=SHOP_NAME,
+        number=number,
+        order_date=_text((data["order_date"] or "")[:10]),
+        customer_name=_text(data["customer_name"]),
+        phone=_text(data["phone"]),
+        address=_text(data["address"]),
+        delivery_date=_text(data["delivery_date"]),
+        status=_text(data["status"]),
+        order_type=_text(data["order_type"]),
+        notes=_text(data["notes"]),
+        payment_rows=payment_rows,
+        total_amount=_money(data["total_amount"]),
+        paid_amount=_money(data["paid_amount"]),
+        remaining_amount=_money(data["total_amount"] - data["paid_amount"]),
+    )
+    return _page(f"فاتورة {number}", body)
+
+
+def render_receipt(data: dict) -> str:
+    """إنشاء HTML إيصال دفعة"""
+    number = receipt_number(data["id"])
+    body = get_template("receipt").substitute(
+        shop_name=SHOP_NAME,
+        number=number,
+        payment_date=_text((data["payment_date"] or "")[:10]),
+        customer_name=_text(data["customer_name"]),
+        phone=_text(data["phone"]),
+        amount=_money(data["amount"]),
+        payment_method=_text(data["payment_method"]),
+        order_type=_text(data["order_type"]),
+        order_number=invoice_number(data["order_id"]),
+        notes=_text(data["notes"]),
+        total_amount=_money(data["total_amount"]),
+        paid_amount=_money(data["paid_amount"]),
+        remaining_amount=_money(data["total_amount"] - data["paid_amount"]),
+    )
+    return _page(f"إيصال {number}", body)
+
+
+# ==================== تحويل PDF ====================
+
+@lru_cache(maxsize=None)
+def pdf_renderer() -> Optional[str]:
+    """المحول المتاح محلياً: "wkhtmltopdf" أو "weasyprint" أو None"""
+    if shutil.which("wkhtmltopdf"):
+        return "wkhtmltopdf"
+    try:
+        import weasyprint  # noqa: F401
+        return "weasyprint"
+    except ImportError:
+        return None
+
+
+def write_document(html: str, path: str) -> str:
+    """
+    كتابة المستند إلى path: ملف PDF إذا انتهى المسار بـ .pdf وتوفر محول،
+    وإلا ملف HTML. يُرجع المسار الذي كُتب فعلاً.
+    """
+    base, ext = os.path.splitext(path)
+    renderer = pdf_renderer() if ext.lower() == ".pdf" else None
+
+    if renderer == "wkhtmltopdf":
+        subprocess.run(["wkhtmltopdf", "--quiet", "--encoding", "utf-8", "-", path],
+                       input=html.encode("utf-8"), check=True)
+        return path
+    if renderer == "weasyprint":
+        import weasyprint
+        weasyprint.HTML(string=html).write_pdf(path)
+        return path
+
+    if ext.lower() != ".html":
+        path = base + ".html"
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write(html)
+    return path
+
+
+def _render_to_file(job) -> str:
+    """مهمة عملية فرعية: إنشاء فاتورة واحدة وكتابتها"""
+    data, path = job
+    return write_document(render_invoice(data), path)
+
+
+# ==================== جلب البيانات والإصدار ====================
+
+class InvoiceRenderer:
+    """إصدار الفواتير والإيصالات من قاعدة البيانات"""
+
+    def __init__(self, crm):
+        self.crm = crm
+        self.db = crm.db
+
+    def fetch_invoices(self, order_ids: List[int]) -> List[dict]:
+        """جلب بيانات عدة فواتير باستعلامين لكل دفعة من الطلبات"""
+        invoices = []
+        for start in range(0, len(order_ids), INVOICE_FETCH_BATCH):
+            ids = json.dumps(list(order_ids[start:start + INVOICE_FETCH_BATCH]))
+
+            orders = self.db.execute_query('''
+                SELECT o.id, o.order_type, o.status, o.order_date, o.delivery_date,
+                       o.total_amount, o.paid_amount, o.notes,
+                       c.name AS customer_name, c.phone, c.address
+                FROM orders o
+                JOIN customers c ON o.customer_id = c.id
+                WHERE o.id IN (SELECT value FROM json_each(?))
+                ORDER BY o.id
+            ''', (ids,)) or []
+
+            payments: Dict[int, List[dict]] = {}
+            for row in self.db.execute_query('''
+                SELECT order_id, payment_date, payment_method, amount
+                FROM payments
+                WHERE order_id IN (SELECT value FROM json_each(?))
+                ORDER BY payment_date, id
+            ''', (ids,)) or []:
+                payments.setdefault(row['order_id'], []).append(dict(row))
+
+            for row in orders:
+                data = dict(row)
+                data['payments'] = payments.get(data['id'], [])
+                invoices.append(data)
+        return invoices
+
+    def fetch_receipt(self, payment_id: int) -> Optional[dict]:
+        """بيانات إيصال دفعة باستعلام واحد"""
+        rows = self.db.execute_query('''
+            SELECT p.id, p.order_id, p.amount, p.payment_date, p.payment_method, p.notes,
+                   o.order_type, o.total_amount, o.paid_amount,
+                   c.name AS customer_name, c.phone
+            FROM payments p
+            JOIN orders o ON p.order_id = o.id
+            JOIN customers c ON o.customer_id = c.id
+            WHERE p.id = ?
+        ''', (payment_id,))
+        return dict(rows[0]) if rows else None
+
+    def invoice_html(self, order_id: int) -> Optional[str]:
+        """HTML فاتورة طلب واحد"""
+        invoices = self.fetch_invoices([order_id])
+        return render_invoice(invoices[0]) if invoices else None
+
+    def receipt_html(self, payment_id: int) -> Optional[str]:
+        """HTML إيصال دفعة واحدة"""
+        data = self.fetch_receipt(payment_id)
+        return render_receipt(data) if data else None
+
+    def render_batch(self, order_ids: List[int], output_dir: str, pdf: bool = False,
+                     workers: Optional[int] = None) -> List[str]:
+        """
+        إصدار فواتير عدة طلبات إلى مجلد (ملف لكل طلب) وإرجاع مسارات الملفات
+
+        الدفعات الصغيرة تُنشأ في العملية الحالية لتجنب كلفة تشغيل العمليات.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        ext = ".pdf" if pdf else ".html"
+        jobs = [(data, os.path.join(output_dir, invoice_number(data['id']) + ext))
+                for data in self.fetch_invoices(order_ids)]
+
+        if len(jobs) < PROCESS_POOL_THRESHOLD or workers == 1:
+            return [_render_to_file(job) for job in jobs]
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, len(jobs) // ((workers or os.cpu_count() or 1) * 4))
+            return list(pool.map(_render_to_file, jobs, chunksize=chunksize))
@@ -0,0 +1,237 @@
+"""
+سجل الكتابة المؤجلة (write-behind journal) لوضع الذاكرة في نظام CRM محل الخياطة
+
+في وضع الذاكرة تُنفذ القراءة والكتابة على نسخة SQLite في الذاكرة، وتُسجل
+كل معاملة مكتملة سطراً واحداً في ملف سجل بجانب قاعدة البيانات، ثم تُطبق
+على الملف على القرص في الخلفية على دفعات داخل معاملة واحدة. عند التعطل
+يُعاد تطبيق المعاملات المكتملة فقط عند الفتح التالي (السطر غير المكتمل
+يُتجاهل كاملاً فلا تُطبق معاملة جزئياً).
+
+تحتفظ الجلسة بقفل حصري على ملف بجانب القاعدة طوال عمرها، فلا تستطيع
+جلسة أخرى استعادة سجل جلسة حية وحذفه، ولا يُطبق أي سطر رقمه التسلسلي
+مسجل مسبقاً في journal_state على القرص.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from typing import List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# الكلمات الأولى لجمل تُسجل حتى لو لم تغير صفوفاً (البنية ونقاط الحفظ)
+JOURNALED_KEYWORDS = ("CREATE", "ALTER", "DROP", "SAVEPOINT", "RELEASE", "ROLLBACK")
+
+
+class JournalLockedError(RuntimeError):
+    """القاعدة مفتوحة في وضع الذاكرة في جلسة أخرى"""
+
+
+class WriteBehindJournal:
+    """تسجيل جمل الكتابة وتطبيقها على القرص في الخلفية"""
+
+    def __init__(self, db_path: str, flush_interval: float = 1.0, flush_batch: int = 500):
+        """
+        flush_interval: أقصى مدة (بالثواني) قبل كتابة التغييرات على القرص
+        flush_batch: عدد المعاملات المعلقة الذي يستدعي الكتابة فوراً
+        """
+        self.db_path = db_path
+        self.path = self.journal_path(db_path)
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+
+        self._lock = threading.Lock()        # يحمي القوائم وملف السجل
+        self._flush_lock = threading.Lock()  # تطبيق دفعة واحدة في كل مرة
+        self._pending: List[dict] = []       # جمل المعاملة المفتوحة
+        self._unflushed: List[dict] = []     # معاملات مسجلة لم تُطبق على القرص بعد
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # القفل قبل الاستعادة: السجل ملك هذه الجلسة حتى close()
+        self._lock_file = self.acquire_lock(db_path)
+        if self._lock_file is None:
+            raise JournalLockedError(f"القاعدة {db_path} مفتوحة في وضع الذاكرة في جلسة أخرى")
+        try:
+            self._seq = self.recover()
+            self._file = open(self.path, "a", encoding="utf-8")
+        except Exception:
+            self._lock_file.close()
+            raise
+
+    @staticmethod
+    def journal_path(db_path: str) -> str:
+        """مسار ملف السجل بجانب قاعدة البيانات"""
+        return db_path + "-journal.jsonl"
+
+    @staticmethod
+    def acquire_lock(db_path: str):
+        """
+        قفل حصري غير منتظر على ملف القفل؛ يُرجع الملف المفتوح (يُحرر القفل
+        بإغلاقه) أو None إذا كانت جلسة أخرى تحتفظ به
+        """
+        fh = open(db_path + "-journal.lock", "a+b")
+        try:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            fh.close()
+            return None
+        return fh
+
+    # ==================== الاستعادة ====================
+
+    def recover(self) -> int:
+        """تطبيق ما تبقى في السجل من جلسة سابقة وإرجاع آخر رقم تسلسلي"""
+        entries = []
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        # سطر أخير غير مكتمل بسبب التعطل
+                        break
+
+        disk = self._connect_disk()
+        try:
+            applied = self._apply(disk, entries)
+        finally:
+            disk.close()
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        return applied
+
+    def _connect_disk(self):
+        disk = sqlite3.connect(self.db_path, isolation_level=None)
+        disk.execute("CREATE TABLE IF NOT EXISTS journal_state (id INTEGER PRIMARY KEY, seq INTEGER)")
+        return disk
+
+    @staticmethod
+    def _apply(disk, entries) -> int:
+        """
+        تطبيق دفعة من المعاملات على القرص في معاملة واحدة وإرجاع آخر رقم
+        تسلسلي مطبق. المعاملات المسجلة مسبقاً في journal_state تُتخطى.
+        """
+        disk.execute("BEGIN IMMEDIATE")
+        try:
+            applied = disk.execute("SELECT seq FROM journal_state WHERE id = 1").fetchone()
+            applied = applied[0] if applied else 0
+            entries = [entry for entry in entries if entry["seq"] > applied]
+            if not entries:
+                disk.execute("COMMIT")
+                return applied
+
+            for entry in entries:
+                for statement in entry["statements"]:
+                    if statement.get("many"):
+                        disk.executemany(statement["sql"], statement["params"])
+                    else:
+                        disk.execute(statement["sql"], statement["params"])
+            disk.execute("INSERT OR REPLACE INTO journal_state (id, seq) VALUES (1, ?)",
+                         (entries[-1]["seq"],))
+            disk.execute("COMMIT")
+        except Exception:
+            disk.execute("ROLLBACK")
+            raise
+        return entries[-1]["seq"]
+
+    # ==================== التسجيل ====================
+
+    @staticmethod
+    def is_write(query: str, changed: bool) -> bool:
+        """هل يجب تسجيل الجملة؟"""
+        return changed or query.lstrip().upper().startswith(JOURNALED_KEYWORDS)
+
+    def record(self, query: str, params, many: bool = False):
+        """تسجيل جملة كتابة ناجحة ضمن المعاملة الحالية"""
+        if many:
+            params = [list(p) for p in params]
+        else:
+            params = list(params or ())
+        self._pending.append({"sql": query, "params": params, "many": many})
+
+    def commit(self):
+        """كتابة المعاملة المكتملة في ملف السجل كسطر واحد"""
+        if not self._pending:
+            return
+        with self._lock:
+            self._seq += 1
+            entry = {"seq": self._seq, "statements": self._pending}
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+            self._unflushed.append(entry)
+            count = len(self._unflushed)
+        self._pending = []
+        if count >= self.flush_batch:
+            self._wakeup.set()
+
+    def discard(self):
+        """إلغاء جمل معاملة تم التراجع عنها"""
+        self._pending = []
+
+    # ==================== الكتابة على القرص ====================
+
+    def start(self):
+        """بدء خيط الكتابة في الخلفية"""
+        self._thread = threading.Thread(target=self._run, name="crm-journal", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"خطأ في كتابة السجل على القرص: {e}")
+
+    def flush(self):
+        """تطبيق الجمل المعلقة على القرص ثم تفريغ السجل إذا اكتمل"""
+        with self._flush_lock:
+            with self._lock:
+                entries = self._unflushed
+                self._unflushed = []
+                if entries:
+                    os.fsync(self._file.fileno())
+            if not entries:
+                return
+
+            disk = self._connect_disk()
+            try:
+                self._apply(disk, entries)
+            except Exception:
+                # إعادة الجمل إلى رأس القائمة للمحاولة لاحقاً
+                with self._lock:
+                    self._unflushed = entries + self._unflushed
+                raise
+            finally:
+                disk.close()
+
+            with self._lock:
+                if not self._unflushed:
+                    self._file.truncate(0)
+                    self._file.seek(0)
+
+    def close(self):
+        """إيقاف الخيط وكتابة كل ما تبقى على القرص"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        self._file.close()
+        if os.path.exists(self.path) and os.path.getsize(self.path) == 0:
+            os.remove(self.path)
+        self._lock_file.close()
@@ -2,16 +2,70 @@
 منطق العمل (Business Logic) لنظام CRM محل الخياطة
 """
 
-from database import Database
-from models import Customer, Order, Measurement, Appointment, Payment
+from database import (Database, PHONE_BACKFILL_BATCH, UNPAID_ORDER_PREDICATE,
+                      OPEN_ORDER_PREDICATE, READY_ORDER_PREDICATE)
+from models import (Customer, Order, Measurement, Appointment, Payment,
+                    ORDER_STATUS_DELIVERED, ORDER_STATUS_CANCELLED,
+                    APPOINTMENT_STATUS_SCHEDULED)
+from repository import Repository
+from normalize import normalize_phone, normalize_name, name_block_key
 from datetime import datetime
+from collections import OrderedDict
+import json
 from typing import List, Optional
 
 
+# عدد ملفات العملاء المخزنة مؤقتاً وعدد القياسات الأخيرة المعروضة في الملف
+PROFILE_CACHE_SIZE = 256
+PROFILE_MEASUREMENTS_LIMIT = 5
+
+# ترتيب قوائم المتابعة: حسب المبلغ المتبقي أو أيام التأخير
+OPEN_ORDER_SORTS = {
+    "amount": "remaining_amount DESC, days_overdue DESC",
+    "days": "days_overdue DESC, remaining_amount DESC",
+}
+
+
 class CRMLogic:
-    def __init__(self):
-        """تهيئة منطق العمل"""
-        self.db = Database()
+    def __init__(self, db_path: str = "tailor_crm.db", engine: str = "disk"):
+        """تهيئة منطق العمل (engine="memory" لخدمة القراءة من نسخة في الذاكرة)"""
+        self.db = Database(db_path, engine)
+        
+        # مستودعات عامة بجمل SQL مبنية مسبقاً لكل نموذج
+        self.customers = Repository(self.db, Customer)
+        self.orders = Repository(self.db, Order)
+        self.measurements = Repository(self.db, Measurement)
+        self.appointments = Repository(self.db, Appointment)
+        self.payments = Repository(self.db, Payment)
+        
+        # ملفات العملاء المخزنة مؤقتاً: customer_id -> (تاريخ اليوم، الملف)
+        self._profile_cache = OrderedDict()
+        
+        # مستمعو التغييرات (مثل جدولة التذكيرات): callback(table, ids)
+        self._listeners = []
+    
+    def add_listener(self, callback):
+        """تسجيل دالة تُستدعى بعد كل تغيير على العملاء أو الطلبات أو المواعيد"""
+        self._listeners.append(callback)
+    
+    def _notify(self, table: str, ids):
+        """إبلاغ المستمعين بالصفوف التي تغيرت"""
+        ids = [i for i in ids if i is not None]
+        if not ids:
+            return
+        for callback in self._listeners:
+            try:
+                callback(table, ids)
+            except Exception as e:
+                print(f"خطأ في معالجة التغيير: {e}")
+    
+    def _invalidate_profiles(self, customer_ids=None):
+        """إبطال ملفات العملاء المخزنة (جميعها إذا لم تُحدد المعرفات)"""
+        if customer_ids is None:
+            self._profile_cache.clear()
+            return
+        for customer_id in customer_ids:
+            self._profile_cache.pop(customer_id, None)
     
     # ==================== إدارة العملاء ====================
     
@@ -21,15 +75,9 @@ class CRMLogic:
             current_time = self.db.get_current_timestamp()
             customer.created_at = current_time
             customer.updated_at = current_time
+            customer.phone_key = normalize_phone(customer.phone)
             
-            query = '''
-                INSERT INTO customers (name, phone, address, email, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-            '''
-            params = (customer.name, customer.phone, customer.address, 
-                     customer.email, customer.created_at, customer.updated_at)
-            
-            return self.db.execute_insert(query, params)
+            return self.customers.insert(customer)
         except Exception as e:
             print(f"خطأ في إضافة العميل: {e}")
             return None
@@ -37,16 +85,7 @@ class CRMLogic:
     def get_all_customers(self) -> List[Customer]:
         """الحصول على جميع العملاء"""
         try:
-            query = "SELECT * FROM customers ORDER BY name"
-            results = self.db.execute_query(query)
-            
-            customers = []
-            if results:
-                for row in results:
-                    customer = Customer.from_dict(dict(row))
-                    customers.append(customer)
-            
-            return customers
+            return self.customers.find(order_by="name")
         except Exception as e:
             print(f"خطأ في جلب العملاء: {e}")
             return []
@@ -54,31 +93,29 @@ class CRMLogic:
     def get_customer_by_id(self, customer_id: int) -> Optional[Customer]:
         """الحصول على عميل بواسطة ID"""
         try:
-            query = "SELECT * FROM customers WHERE id = ?"
-            results = self.db.execute_query(query, (customer_id,))
-            
-            if results:
-                return Customer.from_dict(dict(results[0]))
-            return None
+            return self.customers.get(customer_id)
         except Exception as e:
             print(f"خطأ في جلب العميل: {e}")
             return None
     
+    def get_customers_by_ids(self, customer_ids: List[int]) -> List[Customer]:
+        """الحصول على عدة عملاء باستعلام واحد"""
+        try:
+            return self.customers.get_many(customer_ids)
+        except Exception as e:
+            print(f"خطأ في جلب العملاء: {e}")
+            return []
+    
     def update_customer(self, customer: Customer) -> bool:
         """تحديث بيانات عميل"""
         try:
             customer.updated_at = self.db.get_current_timestamp()
+            customer.phone_key = normalize_phone(customer.phone)
             
-            query = '''
-                UPDATE customers 
-                SET name = ?, phone = ?, address = ?, email = ?, updated_at = ?
-                WHERE id = ?
-            '''
-            params = (customer.name, customer.phone, customer.address, 
-                     customer.email, customer.updated_at, customer.id)
-            
-            self.db.execute_query(query, params)
-            return True
+            self._invalidate_profiles([customer.id])
+            result = self.customers.update(customer)
+            self._notify('customers', [customer.id])
+            return result
         except Exception as e:
             print(f"خطأ في تحديث العميل: {e}")
             return False
@@ -92,36 +129,246 @@ class CRMLogic:
                 print("لا يمكن حذف العميل لوجود طلبات مرتبطة به")
                 return False
             
-            query = "DELETE FROM customers WHERE id = ?"
-            self.db.execute_query(query, (customer_id,))
-            return True
+            self._invalidate_profiles([customer_id])
+            return self.customers.delete(customer_id)
         except Exception as e:
             print(f"خطأ في حذف العميل: {e}")
             return False
     
+    def find_customer_by_phone(self, phone: str) -> Optional[Customer]:
+        """البحث عن عميل برقم الهاتف عبر الفهرس الموحد (بأي صيغة كتب الرقم)"""
+        try:
+            phone_key = normalize_phone(phone)
+            if not phone_key:
+                return None
+            results = self.customers.find("phone_key = ?", (phone_key,))
+            return results[0] if results else None
+        except Exception as e:
+            print(f"خطأ في البحث برقم الهاتف: {e}")
+            return None
+    
     def search_customers(self, search_term: str) -> List[Customer]:
         """البحث عن العملاء"""
         try:
-            query = '''
-                SELECT * FROM customers 
-                WHERE name LIKE ? OR phone LIKE ? OR address LIKE ?
-                ORDER BY name
-            '''
+            # رقم هاتف كامل: بحث مباشر في الفهرس بدلاً من المسح بـ LIKE
+            if search_term and not any(ch.isalpha() for ch in search_term):
+                customer = self.find_customer_by_phone(search_term)
+                if customer:
+                    return [customer]
+            
             search_pattern = f"%{search_term}%"
             params = (search_pattern, search_pattern, search_pattern)
+            return self.customers.find("name LIKE ? OR phone LIKE ? OR address LIKE ?",
+                                       params, "name")
+        except Exception as e:
+            print(f"خطأ في البحث عن العملاء: {e}")
+            return []
+    
+    def get_customer_profile(self, customer_id: int) -> Optional[dict]:
+        """
+        ملف العميل الكامل (البيانات، الطلبات مع المدفوع والمتبقي، آخر القياسات،
+        المواعيد القادمة والإجماليات) باستعلام واحد، مع تخزينه مؤقتاً
+        """
+        today = datetime.now().strftime("%Y-%m-%d")
+        cached = self._profile_cache.get(customer_id)
+        if cached and cached[0] == today:
+            self._profile_cache.move_to_end(customer_id)
+            return cached[1]
+        
+        try:
+            query = '''
+                SELECT json_object(
+                    'customer', json_object(
+                        'id', c.id, 'name', c.name, 'phone', c.phone, 'phone_key', c.phone_key,
+                        'address', c.address, 'email', c.email,
+                        'created_at', c.created_at, 'updated_at', c.updated_at),
+                    'orders', (
+                        SELECT json_group_array(json_object(
+                            'id', o.id, 'order_type', o.order_type, 'status', o.status,
+                            'order_date', o.order_date, 'delivery_date', o.delivery_date,
+                            'total_amount', o.total_amount, 'paid_amount', o.paid_amount,
+                            'remaining_amount', o.total_amount - o.paid_amount,
+                            'payments_count', COALESCE(p.payments_count, 0),
+                            'payments_total', COALESCE(p.payments_total, 0),
+                            'notes', o.notes))
+                        FROM (SELECT * FROM orders WHERE customer_id = c.id
+                              ORDER BY order_date DESC) o
+                        LEFT JOIN (SELECT order_id, COUNT(*) AS payments_count,
+                                          SUM(amount) AS payments_total
+                                   FROM payments
+                                   WHERE order_id IN (SELECT id FROM orders WHERE customer_id = c.id)
+                                   GROUP BY order_id) p ON p.order_id = o.id),
+                    'measurements', (
+                        SELECT json_group_array(json_object(
+                            'id', m.id, 'customer_id', m.customer_id, 'order_id', m.order_id,
+                            'height', m.height, 'shoulder_width', m.shoulder_width,
+                            'sleeve_length', m.sleeve_length, 'chest_width', m.chest_width,
+                            'waist_width', m.waist_width, 'neck_size', m.neck_size,
+                            'arm_circumference', m.arm_circumference,
+                            'thigh_circumference', m.thigh_circumference,
+                            'notes', m.notes, 'created_at', m.created_at,
+                            'updated_at', m.updated_at))
+                        FROM (SELECT * FROM measurements WHERE customer_id = c.id
+                              ORDER BY created_at DESC LIMIT ?) m),
+                    'appointments', (
+                        SELECT json_group_array(json_object(
+                            'id', a.id, 'customer_id', a.customer_id, 'date', a.date,
+                            'time', a.time, 'purpose', a.purpose, 'status', a.status,
+                            'notes', a.notes, 'created_at', a.created_at,
+                            'updated_at', a.updated_at))
+                        FROM (SELECT * FROM appointments
+                              WHERE customer_id = c.id AND date >= ? AND status = ?
+                              ORDER BY date, time) a),
+                    'totals', (
+                        SELECT json_object(
+                            'orders_count', COUNT(*),
+                            'total_amount', COALESCE(SUM(total_amount), 0),
+                            'paid_amount', COALESCE(SUM(paid_amount), 0),
+                            'remaining_amount', COALESCE(SUM(total_amount - paid_amount), 0),
+                            'open_orders', COALESCE(SUM(status NOT IN (?, ?)), 0))
+                        FROM orders WHERE customer_id = c.id)
+                )
+                FROM customers c
+                WHERE c.id = ?
+            '''
+            params = (PROFILE_MEASUREMENTS_LIMIT, today, APPOINTMENT_STATUS_SCHEDULED,
+                      ORDER_STATUS_DELIVERED, ORDER_STATUS_CANCELLED, customer_id)
             results = self.db.execute_query(query, params)
+            if not results:
+                return None
             
-            customers = []
-            if results:
-                for row in results:
-                    customer = Customer.from_dict(dict(row))
-                    customers.append(customer)
+            data = json.loads(results[0][0])
+            profile = {
+                'customer': Customer.from_dict(data['customer']),
+                'orders': data['orders'],
+                'measurements': [Measurement.from_dict(m) for m in data['measurements']],
+                'appointments': [Appointment.from_dict(a) for a in data['appointments']],
+                'totals': data['totals'],
+            }
             
-            return customers
+            self._profile_cache[customer_id] = (today, profile)
+            if len(self._profile_cache) > PROFILE_CACHE_SIZE:
+                self._profile_cache.popitem(last=False)
+            return profile
         except Exception as e:
-            print(f"خطأ في البحث عن العملاء: {e}")
+            print(f"خطأ في جلب ملف العميل: {e}")
+            return None
+    
+    def backfill_phone_keys(self, batch_size: int = PHONE_BACKFILL_BATCH) -> int:
+        """
+        تعبئة رقم الهاتف الموحد للعملاء الذين لا يملكونه، على دفعات.
+        الأرقام المكررة تبقى فارغة حتى يتم دمج العملاء المكررين. الترقية الأولى
+        تتم مرة واحدة في تهيئة قاعدة البيانات، وهذه للتشغيل اليدوي بعد ذلك
+        """
+        filled = 0
+        last_id = 0
+        try:
+            while True:
+                rows = self.db.execute_query('''
+                    SELECT id, phone FROM customers
+                    WHERE phone_key IS NULL AND id > ?
+                    ORDER BY id LIMIT ?
+                ''', (last_id, batch_size))
+                if not rows:
+                    break
+                last_id = rows[-1]['id']
+                
+                params = [(key, row['id']) for row in rows
+                          if (key := normalize_phone(row['phone']))]
+                if params:
+                    count = self.db.execute_many(
+                        "UPDATE OR IGNORE customers SET phone_key = ? WHERE id = ?", params)
+                    filled += count or 0
+            return filled
+        except Exception as e:
+            print(f"خطأ في تعبئة أرقام الهواتف: {e}")
+            return filled
+    
+    def find_duplicate_customers(self) -> List[dict]:
+        """
+        اكتشاف العملاء المكررين المحتملين بالتجميع حسب رقم الهاتف الموحد
+        وحسب تجزئة الاسم الموحد (دون مقارنة كل عميل بكل عميل)
+        
+        confirmed: تطابق الهاتف، أو تطابق الاسم مع نفس العنوان أو البريد لكل
+        أفراد المجموعة. تطابق الاسم وحده شائع (مثل "محمد علي") ولا يكفي للدمج
+        الكامل دون اختيار المستخدم
+        """
+        try:
+            customers = self.customers.find(order_by="id")
+            by_phone = {}
+            by_name = {}
+            for customer in customers:
+                phone_key = normalize_phone(customer.phone)
+                if phone_key:
+                    by_phone.setdefault(phone_key, []).append(customer)
+                name_key = name_block_key(customer.name)
+                if name_key:
+                    by_name.setdefault(name_key, []).append(customer)
+            
+            groups = []
+            seen = set()
+            for reason, buckets in (('phone', by_phone), ('name', by_name)):
+                for bucket in buckets.values():
+                    ids = tuple(c.id for c in bucket)
+                    if len(bucket) > 1 and ids not in seen:
+                        seen.add(ids)
+                        confirmed = reason == 'phone' or self._share_contact(bucket)
+                        groups.append({'reason': reason, 'customers': bucket,
+                                       'confirmed': confirmed})
+            return groups
+        except Exception as e:
+            print(f"خطأ في اكتشاف العملاء المكررين: {e}")
             return []
     
+    @staticmethod
+    def _share_contact(customers: List[Customer]) -> bool:
+        """هل يشترك كل العملاء في نفس العنوان أو نفس البريد الإلكتروني (غير الفارغ)؟"""
+        for values in ([normalize_name(c.address) for c in customers],
+                       [(c.email or "").strip().lower() for c in customers]):
+            if values[0] and len(set(values)) == 1:
+                return True
+        return False
+    
+    def merge_customers(self, keep_id: int, duplicate_ids: List[int]) -> bool:
+        """
+        دمج عملاء مكررين في عميل واحد: نقل الطلبات (ومدفوعاتها) والقياسات
+        والمواعيد إليه ثم حذف المكررين، في معاملة واحدة
+        """
+        duplicate_ids = [i for i in duplicate_ids if i != keep_id]
+        if not duplicate_ids:
+            return True
+        
+        try:
+            self._invalidate_profiles()
+            ids = json.dumps(duplicate_ids)
+            with self.db.transaction():
+                keep = self.customers.get(keep_id)
+                if keep is None:
+                    raise ValueError(f"العميل {keep_id} غير موجود")
+                duplicates = self.customers.get_many(duplicate_ids)
+                
+                for table in ('orders', 'measurements', 'appointments'):
+                    self.db.execute_query(
+                        f"UPDATE {table} SET customer_id = ? "
+                        f"WHERE customer_id IN (SELECT value FROM json_each(?))",
+                        (keep_id, ids))
+                self.customers.delete_many(duplicate_ids)
+                
+                # استكمال البيانات الناقصة من السجلات المكررة
+                original = Customer(**keep.to_dict())
+                for duplicate in duplicates:
+                    keep.phone = keep.phone or duplicate.phone
+                    keep.address = keep.address or duplicate.address
+                    keep.email = keep.email or duplicate.email
+                keep.phone_key = normalize_phone(keep.phone)
+                keep.updated_at = self.db.get_current_timestamp()
+                self.customers.update(keep, original)
+            self._notify('customers', [keep_id])
+            return True
+        except Exception as e:
+            print(f"خطأ في دمج العملاء: {e}")
+            return False
+    
     # ==================== إدارة الطلبات ====================
     
     def add_order(self, order: Order) -> Optional[int]:
@@ -130,20 +377,15 @@ class CRMLogic:
             current_time = self.db.get_current_timestamp()
             if not order.order_date:
                 order.order_date = current_time
+            # تاريخ تسليم فارغ يُحفظ NULL حتى لا يدخل في نطاقات التواريخ
+            order.delivery_date = order.delivery_date or None
             order.created_at = current_time
             order.updated_at = current_time
             
-            query = '''
-                INSERT INTO orders (customer_id, order_type, status, order_date, 
-                                  delivery_date, total_amount, paid_amount, notes, 
-                                  created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            '''
-            params = (order.customer_id, order.order_type, order.status, 
-                     order.order_date, order.delivery_date, order.total_amount,
-                     order.paid_amount, order.notes, order.created_at, order.updated_at)
-            
-            return self.db.execute_insert(query, params)
+            self._invalidate_profiles([order.customer_id])
+            order_id = self.orders.insert(order)
+            self._notify('orders', [order_id])
+            return order_id
         except Exception as e:
             print(f"خطأ في إضافة الطلب: {e}")
             return None
@@ -173,16 +415,7 @@ class CRMLogic:
     def get_orders_by_customer(self, customer_id: int) -> List[Order]:
         """الحصول على طلبات عميل معين"""
         try:
-            query = "SELECT * FROM orders WHERE customer_id = ? ORDER BY order_date DESC"
-            results = self.db.execute_query(query, (customer_id,))
-            
-            orders = []
-            if results:
-                for row in results:
-                    order = Order.from_dict(dict(row))
-                    orders.append(order)
-            
-            return orders
+            return self.orders.find("customer_id = ?", (customer_id,), "order_date DESC")
         except Exception as e:
             print(f"خطأ في جلب طلبات العميل: {e}")
             return []
@@ -191,20 +424,13 @@ class CRMLogic:
         """تحديث طلب"""
         try:
             order.updated_at = self.db.get_current_timestamp()
+            order.delivery_date = order.delivery_date or None
             
-            query = '''
-                UPDATE orders 
-                SET customer_id = ?, order_type = ?, status = ?, order_date = ?,
-                    delivery_date = ?, total_amount = ?, paid_amount = ?, 
-                    notes = ?, updated_at = ?
-                WHERE id = ?
-            '''
-            params = (order.customer_id, order.order_type, order.status,
-                     order.order_date, order.delivery_date, order.total_amount,
-                     order.paid_amount, order.notes, order.updated_at, order.id)
-            
-            self.db.execute_query(query, params)
-            return True
+            # قد يتغير عميل الطلب، لذا تُبطل جميع الملفات المخزنة
+            self._invalidate_profiles()
+            result = self.orders.update(order)
+            self._notify('orders', [order.id])
+            return result
         except Exception as e:
             print(f"خطأ في تحديث الطلب: {e}")
             return False
@@ -212,17 +438,147 @@ class CRMLogic:
     def delete_order(self, order_id: int) -> bool:
         """حذف طلب"""
         try:
-            # حذف المدفوعات المرتبطة بالطلب أولاً
-            self.db.execute_query("DELETE FROM payments WHERE order_id = ?", (order_id,))
-            
-            # حذف الطلب
-            query = "DELETE FROM orders WHERE id = ?"
-            self.db.execute_query(query, (order_id,))
-            return True
+            self._invalidate_profiles()
+            with self.db.transaction():
+                # حذف المدفوعات المرتبطة بالطلب أولاً، وفك ربط قياساته
+                self.db.execute_query("DELETE FROM payments WHERE order_id = ?", (order_id,))
+                self.db.execute_query(
+                    "UPDATE measurements SET order_id = NULL WHERE order_id = ?", (order_id,))
+                
+                # حذف الطلب
+                result = self.orders.delete(order_id)
+            self._notify('orders', [order_id])
+            return result
         except Exception as e:
             print(f"خطأ في حذف الطلب: {e}")
             return False
     
+    def get_orders_by_ids(self, order_ids: List[int]) -> List[dict]:
+        """الحصول على عدة طلبات مع أسماء العملاء باستعلام واحد"""
+        try:
+            query = '''
+                SELECT o.*, c.name as customer_name
+                FROM orders o
+                JOIN customers c ON o.customer_id = c.id
+                WHERE o.id IN (SELECT value FROM json_each(?))
+            '''
+            results = self.db.execute_query(query, (json.dumps(list(order_ids)),))
+            return [dict(row) for row in results] if results else []
+        except Exception as e:
+            print(f"خطأ في جلب الطلبات: {e}")
+            return []
+    
+    def bulk_update_order_status(self, order_ids: List[int], status: str) -> bool:
+        """تغيير حالة عدة طلبات بجملة واحدة"""
+        try:
+            changes = {'status': status, 'updated_at': self.db.get_current_timestamp()}
+            self._invalidate_profiles()
+            result = self.orders.update_many(order_ids, changes)
+            self._notify('orders', order_ids)
+            return result
+        except Exception as e:
+            print(f"خطأ في تحديث الطلبات: {e}")
+            return False
+    
+    def bulk_reschedule_orders(self, order_ids: List[int], delivery_date: str) -> bool:
+        """تغيير تاريخ تسليم عدة طلبات بجملة واحدة"""
+        try:
+            changes = {'delivery_date': delivery_date or None,
+                       'updated_at': self.db.get_current_timestamp()}
+            self._invalidate_profiles()
+            result = self.orders.update_many(order_ids, changes)
+            self._notify('orders', order_ids)
+            return result
+        except Exception as e:
+            print(f"خطأ في تحديث الطلبات: {e}")
+            return False
+    
+    def bulk_delete_orders(self, order_ids: List[int]) -> bool:
+        """حذف عدة طلبات مع مدفوعاتها (وفك ربط قياساتها) في معاملة واحدة"""
+        try:
+            self._invalidate_profiles()
+            ids = json.dumps(list(order_ids))
+            with self.db.transaction():
+                self.db.execute_query(
+                    "DELETE FROM payments WHERE order_id IN (SELECT value FROM json_each(?))",
+                    (ids,))
+                self.db.execute_query(
+                    "UPDATE measurements SET order_id = NULL "
+                    "WHERE order_id IN (SELECT value FROM json_each(?))", (ids,))
+                self.orders.delete_many(order_ids)
+            self._notify('orders', order_ids)
+            return True
+        except Exception as e:
+            print(f"خطأ في حذف الطلبات: {e}")
+            return False
+    
+    # ==================== متابعة الطلبات المفتوحة ====================
+    
+    def _open_orders_view(self, where: str, params: tuple, sort: str) -> List[dict]:
+        """استعلام مشترك لقوائم المتابعة مع المبلغ المتبقي وأيام التأخير"""
+        query = f'''
+            SELECT o.*, c.name AS customer_name, c.phone,
+                   o.total_amount - o.paid_amount AS remaining_amount,
+                   CAST(julianday(?) - julianday(o.delivery_date) AS INTEGER) AS days_overdue
+            FROM orders o
+            JOIN customers c ON o.customer_id = c.id
+            WHERE {where}
+            ORDER BY {OPEN_ORDER_SORTS[sort]}
+        '''
+        today = datetime.now().strftime("%Y-%m-%d")
+        results = self.db.execute_query(query, (today,) + params)
+        return [dict(row) for row in results] if results else []
+    
+    def get_unpaid_orders(self, sort: str = "amount") -> List[dict]:
+        """الطلبات التي عليها مبالغ متبقية (sort: "amount" أو "days")"""
+        try:
+            where = UNPAID_ORDER_PREDICATE.format(alias="o.") + " AND o.status != ?"
+            return self._open_orders_view(where, (ORDER_STATUS_CANCELLED,), sort)
+        except Exception as e:
+            print(f"خطأ في جلب المبالغ المتبقية: {e}")
+            return []
+    
+    def get_overdue_orders(self, sort: str = "days") -> List[dict]:
+        """الطلبات المفتوحة التي تجاوزت تاريخ التسليم"""
+        try:
+            # الحد الأدنى يستبعد تواريخ التسليم الفارغة المتبقية من البيانات القديمة
+            today = datetime.now().strftime("%Y-%m-%d")
+            where = (OPEN_ORDER_PREDICATE.format(alias="o.")
+                     + " AND o.delivery_date >= ? AND o.delivery_date < ?")
+            return self._open_orders_view(where, ("0000-01-01", today), sort)
+        except Exception as e:
+            print(f"خطأ في جلب الطلبات المتأخرة: {e}")
+            return []
+    
+    def get_ready_orders(self, sort: str = "days") -> List[dict]:
+        """الطلبات الجاهزة بانتظار استلام العميل"""
+        try:
+            return self._open_orders_view(READY_ORDER_PREDICATE.format(alias="o."), (), sort)
+        except Exception as e:
+            print(f"خطأ في جلب الطلبات الجاهزة: {e}")
+            return []
+    
+    def get_customer_balances(self, sort: str = "amount") -> List[dict]:
+        """إجمالي المبالغ المتبقية لكل عميل (من الطلبات غير المسددة فقط)"""
+        try:
+            query = f'''
+                SELECT c.id AS customer_id, c.name AS customer_name, c.phone,
+                       COUNT(*) AS orders_count,
+                       SUM(o.total_amount - o.paid_amount) AS remaining_amount,
+                       MAX(CAST(julianday(?) - julianday(o.delivery_date) AS INTEGER)) AS days_overdue
+                FROM orders o
+                JOIN customers c ON o.customer_id = c.id
+                WHERE {UNPAID_ORDER_PREDICATE.format(alias='o.')} AND o.status != ?
+                GROUP BY c.id
+                ORDER BY {OPEN_ORDER_SORTS[sort]}
+            '''
+            today = datetime.now().strftime("%Y-%m-%d")
+            results = self.db.execute_query(query, (today, ORDER_STATUS_CANCELLED))
+            return [dict(row) for row in results] if results else []
+        except Exception as e:
+            print(f"خطأ في جلب أرصدة العملاء: {e}")
+            return []
+    
     # ==================== إدارة القياسات ====================
     
     def add_measurement(self, measurement: Measurement) -> Optional[int]:
@@ -232,20 +588,8 @@ class CRMLogic:
             measurement.created_at = current_time
             measurement.updated_at = current_time
             
-            query = '''
-                INSERT INTO measurements (customer_id, order_id, height, shoulder_width,
-                                        sleeve_length, chest_width, waist_width, neck_size,
-                                        arm_circumference, thigh_circumference, notes,
-                                        created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            '''
-            params = (measurement.customer_id, measurement.order_id, measurement.height,
-                     measurement.shoulder_width, measurement.sleeve_length, measurement.chest_width,
-                     measurement.waist_width, measurement.neck_size, measurement.arm_circumference,
-                     measurement.thigh_circumference, measurement.notes, measurement.created_at,
-                     measurement.updated_at)
-            
-            return self.db.execute_insert(query, params)
+            self._invalidate_profiles([measurement.customer_id])
+            return self.measurements.insert(measurement)
         except Exception as e:
             print(f"خطأ في إضافة القياس: {e}")
             return None
@@ -275,16 +619,7 @@ class CRMLogic:
     def get_measurements_by_customer(self, customer_id: int) -> List[Measurement]:
         """الحصول على قياسات عميل معين"""
         try:
-            query = "SELECT * FROM measurements WHERE customer_id = ? ORDER BY created_at DESC"
-            results = self.db.execute_query(query, (customer_id,))
-            
-            measurements = []
-            if results:
-                for row in results:
-                    measurement = Measurement.from_dict(dict(row))
-                    measurements.append(measurement)
-            
-            return measurements
+            return self.measurements.find("customer_id = ?", (customer_id,), "created_at DESC")
         except Exception as e:
             print(f"خطأ في جلب قياسات العميل: {e}")
             return []
@@ -298,16 +633,10 @@ class CRMLogic:
             appointment.created_at = current_time
             appointment.updated_at = current_time
             
-            query = '''
-                INSERT INTO appointments (customer_id, date, time, purpose, status, 
-                                        notes, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            '''
-            params = (appointment.customer_id, appointment.date, appointment.time,
-                     appointment.purpose, appointment.status, appointment.notes,
-                     appointment.created_at, appointment.updated_at)
-            
-            return self.db.execute_insert(query, params)
+            self._invalidate_profiles([appointment.customer_id])
+            appointment_id = self.appointments.insert(appointment)
+            self._notify('appointments', [appointment_id])
+            return appointment_id
         except Exception as e:
             print(f"خطأ في إضافة الموعد: {e}")
             return None
@@ -318,4 +647,168 @@ class CRMLogic:
             query = '''
                 SELECT a.*, c.name as customer_name
                 FROM appointments a
-   
+                JOIN customers c ON a.customer_id = c.id
+                ORDER BY a.date DESC, a.time
+            '''
+            results = self.db.execute_query(query)
+            
+            appointments = []
+            if results:
+                for row in results:
+                    appointment_dict = dict(row)
+                    appointments.append(appointment_dict)
+            
+            return appointments
+        except Exception as e:
+            print(f"خطأ في جلب المواعيد: {e}")
+            return []
+    
+    def get_appointments_by_date(self, date: str) -> List[dict]:
+        """الحصول على مواعيد يوم معين (YYYY-MM-DD) مرتبة حسب الوقت"""
+        try:
+            query = '''
+                SELECT a.*, c.name as customer_name
+                FROM appointments a
+                JOIN customers c ON a.customer_id = c.id
+                WHERE a.date = ?
+                ORDER BY a.time
+            '''
+            results = self.db.execute_query(query, (date,))
+            return [dict(row) for row in results] if results else []
+        except Exception as e:
+            print(f"خطأ في جلب مواعيد اليوم: {e}")
+            return []
+    
+    def get_appointments_by_ids(self, appointment_ids: List[int]) -> List[dict]:
+        """الحصول على عدة مواعيد مع أسماء العملاء باستعلام واحد"""
+        try:
+            query = '''
+                SELECT a.*, c.name as customer_name
+                FROM appointments a
+                JOIN customers c ON a.customer_id = c.id
+                WHERE a.id IN (SELECT value FROM json_each(?))
+            '''
+            results = self.db.execute_query(query, (json.dumps(list(appointment_ids)),))
+            return [dict(row) for row in results] if results else []
+        except Exception as e:
+            print(f"خطأ في جلب المواعيد: {e}")
+            return []
+    
+    def bulk_update_appointment_status(self, appointment_ids: List[int], status: str) -> bool:
+        """تغيير حالة عدة مواعيد بجملة واحدة"""
+        try:
+            changes = {'status': status, 'updated_at': self.db.get_current_timestamp()}
+            self._invalidate_profiles()
+            result = self.appointments.update_many(appointment_ids, changes)
+            self._notify('appointments', appointment_ids)
+            return result
+        except Exception as e:
+            print(f"خطأ في تحديث المواعيد: {e}")
+            return False
+    
+    def bulk_reschedule_appointments(self, appointment_ids: List[int], date: str,
+                                     time: Optional[str] = None) -> bool:
+        """إعادة جدولة عدة مواعيد بجملة واحدة (مع الإبقاء على الوقت إن لم يُحدد)"""
+        try:
+            changes = {'date': date}
+            if time:
+                changes['time'] = time
+            changes['updated_at'] = self.db.get_current_timestamp()
+            self._invalidate_profiles()
+            result = self.appointments.update_many(appointment_ids, changes)
+            self._notify('appointments', appointment_ids)
+            return result
+        except Exception as e:
+            print(f"خطأ في إعادة جدولة المواعيد: {e}")
+            return False
+    
+    def bulk_delete_appointments(self, appointment_ids: List[int]) -> bool:
+        """حذف عدة مواعيد بجملة واحدة"""
+        try:
+            self._invalidate_profiles()
+            result = self.appointments.delete_many(appointment_ids)
+            self._notify('appointments', appointment_ids)
+            return result
+        except Exception as e:
+            print(f"خطأ في حذف المواعيد: {e}")
+            return False
+    
+    # ==================== إدارة المدفوعات ====================
+    
+    def add_payment(self, payment: Payment) -> Optional[int]:
+        """إضافة دفعة وتحديث المبلغ المدفوع للطلب في معاملة واحدة"""
+        try:
+            current_time = self.db.get_current_timestamp()
+            if not payment.payment_date:
+                payment.payment_date = current_time
+            payment.created_at = current_time
+            payment.updated_at = current_time
+            
+            self._invalidate_profiles()
+            with self.db.transaction():
+                if not self.db.execute_query("SELECT 1 FROM orders WHERE id = ?",
+                                             (payment.order_id,)):
+                    raise ValueError(f"الطلب {payment.order_id} غير موجود")
+                payment_id = self.payments.insert(payment)
+                self.db.execute_query('''
+                    UPDATE orders SET paid_amount = paid_amount + ?, updated_at = ?
+                    WHERE id = ?
+                ''', (payment.amount, current_time, payment.order_id))
+            self._notify('orders', [payment.order_id])
+            return payment_id
+        except Exception as e:
+            print(f"خطأ في إضافة الدفعة: {e}")
+            return None
+    
+    def get_payments_by_order(self, order_id: int) -> List[Payment]:
+        """الحصول على مدفوعات طلب معين"""
+        try:
+            return self.payments.find("order_id = ?", (order_id,), "payment_date")
+        except Exception as e:
+            print(f"خطأ في جلب مدفوعات الطلب: {e}")
+            return []
+    
+    def get_all_payments(self) -> List[dict]:
+        """الحصول على جميع المدفوعات مع نوع الطلب واسم العميل"""
+        try:
+            query = '''
+                SELECT p.*, o.order_type, c.name as customer_name
+                FROM payments p
+                JOIN orders o ON p.order_id = o.id
+                JOIN customers c ON o.customer_id = c.id
+                ORDER BY p.payment_date DESC
+            '''
+            results = self.db.execute_query(query)
+            return [dict(row) for row in results] if results else []
+        except Exception as e:
+            print(f"خطأ في جلب المدفوعات: {e}")
+            return []
+
+    # ==================== التقارير ====================
+    
+    def get_report(self, date_from: Optional[str] = None,
+                   date_to: Optional[str] = None) -> dict:
+        """تقرير ملخص للطلبات والمدفوعات خلال فترة (YYYY-MM-DD)"""
+        try:
+            date_from = date_from or "0000-01-01"
+            date_to = date_to or "9999-01-01"
+            query = '''
+                SELECT
+                    (SELECT COUNT(*) FROM customers) AS customers_count,
+                    COUNT(*) AS orders_count,
+                    COALESCE(SUM(total_amount), 0) AS total_amount,
+                    COALESCE(SUM(paid_amount), 0) AS paid_amount,
+                    COALESCE(SUM(total_amount - paid_amount), 0) AS remaining_amount,
+                    (SELECT COALESCE(SUM(amount), 0) FROM payments
+                     WHERE payment_date >= ? AND payment_date < date(?, '+1 day')) AS payments_received
+                FROM orders
+                WHERE order_date >= ? AND order_date < date(?, '+1 day')
+            '''
+            results = self.db.execute_query(query, (date_from, date_to, date_from, date_to))
+            report = dict(results[0])
+            report['date_from'] = date_from
+            report['date_to'] = date_to
+            return report
+        except Exception as e:
+            print(f"خطأ في إعداد التقرير: {e}")
+            return {}
@@ -1,16 +1,30 @@
 #!/usr/bin/env python3
 """
 نقطة الدخول الرئيسية لنظام CRM محل الخياطة
+
+بدون معاملات تُشغَّل الواجهة الرسومية، ومع معاملات يُشغَّل سطر الأوامر
+دون استيراد PyQt.
 """
 
 import sys
 import os
+import multiprocessing
 
 # إضافة المجلد الحالي إلى مسار Python
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from gui import main
 
-if __name__ == "__main__":
-    main()
+def main():
+    """تشغيل الواجهة الرسومية أو سطر الأوامر حسب المعاملات"""
+    if len(sys.argv) > 1:
+        from cli import main as cli_main
+        return cli_main()
+
+    from gui import main as gui_main
+    return gui_main()
 
+
+if __name__ == "__main__":
+    # مطلوب لعمليات إصدار الفواتير المتوازية في النسخ المجمعة على Windows
+    multiprocessing.freeze_support()
+    sys.exit(main())
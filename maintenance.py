@@ -0,0 +1,213 @@
+"""
+الصيانة التلقائية لقاعدة بيانات نظام CRM محل الخياطة
+
+تحديث إحصائيات مخطط الاستعلامات (ANALYZE و PRAGMA optimize)، واسترجاع
+الصفحات المحررة بخطوات محدودة من incremental_vacuum حتى لا تتوقف
+الواجهة، وتقرير عن صحة القاعدة (الحجم والصفحات الحرة وعدد الصفوف وأحجام
+الفهارس والتجزئة).
+"""
+
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+# مدة خمول المستخدم (بالثواني) قبل تشغيل خطوة صيانة من الواجهة
+MAINTENANCE_IDLE_SECONDS = 120
+
+# عدد الصفحات المسترجعة في كل خطوة أثناء الخمول
+INCREMENTAL_VACUUM_PAGES = 256
+
+# الحد الأقصى للصفوف التي يفحصها ANALYZE لكل فهرس (يحد مدة التنفيذ)
+ANALYSIS_LIMIT = 1000
+
+# نسبة الصفوف المتغيرة (وحدها الأدنى) التي تجعل إحصائيات الجدول قديمة
+STALE_STATS_RATIO = 0.25
+STALE_STATS_MIN_CHANGES = 100
+
+# جداول التطبيق التي تُحسب صحتها
+TABLES = ["customers", "orders", "measurements", "appointments", "payments"]
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+class DatabaseMaintenance:
+    """تشغيل الصيانة على دفعات قصيرة وقت الخمول وبشكل كامل عند الإغلاق"""
+
+    def __init__(self, db):
+        self.db = db
+
+    @contextmanager
+    def _connect(self):
+        """
+        اتصال مباشر بملف القاعدة (في وضع الذاكرة تُكتب التغييرات المعلقة أولاً)
+        """
+        if self.db.db_path == ":memory:":
+            conn = self.db.get_connection()
+        else:
+            self.db.flush()
+            conn = sqlite3.connect(self.db.db_path, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    # ==================== خطوات الصيانة ====================
+
+    def run_idle_step(self, max_pages: int = INCREMENTAL_VACUUM_PAGES) -> Dict[str, object]:
+        """خطوة صيانة قصيرة: تحديث الإحصائيات القديمة واسترجاع عدد محدود من الصفحات"""
+        started = time.perf_counter()
+        with self._connect() as conn:
+            analyzed = self._analyze_stale(conn, exact=False)
+            reclaimed = self._incremental_vacuum(conn, max_pages)
+        return {
+            "analyzed": analyzed,
+            "reclaimed_pages": reclaimed,
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+    def run_full(self) -> Dict[str, object]:
+        """صيانة كاملة (عند الإغلاق أو من سطر الأوامر)"""
+        started = time.perf_counter()
+        with self._connect() as conn:
+            converted = self._ensure_incremental(conn)
+            analyzed = self._analyze_stale(conn, exact=True)
+            conn.execute("PRAGMA optimize")
+            reclaimed = self._incremental_vacuum(conn, None)
+        return {
+            "converted_to_incremental": converted,
+            "analyzed": analyzed,
+            "reclaimed_pages": reclaimed,
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+    def _ensure_incremental(self, conn) -> bool:
+        """
+        تحويل القواعد القديمة إلى auto_vacuum=INCREMENTAL (يتطلب VACUUM مرة واحدة)
+        """
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == AUTO_VACUUM_INCREMENTAL:
+            return False
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        return True
+
+    def _incremental_vacuum(self, conn, max_pages: Optional[int]) -> int:
+        """استرجاع الصفحات الحرة (كلها أو عدداً محدوداً منها)"""
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+            return 0
+        before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if not before:
+            return 0
+        # executescript ينفذ الجملة حتى نهايتها (execute يحرر صفحة واحدة فقط)
+        if max_pages is None:
+            conn.executescript("PRAGMA incremental_vacuum;")
+        else:
+            conn.executescript(f"PRAGMA incremental_vacuum({int(max_pages)});")
+        return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    def _analyze_stale(self, conn, exact: bool) -> list:
+        """
+        تشغيل ANALYZE للجداول التي تغير كثير من صفوفها منذ آخر تحليل.
+
+        تُقارن الحالة بلقطة تُحفظ بعد كل ANALYZE (عدد الصفوف وعداد الإدراج من
+        sqlite_sequence)، لا بإحصائيات sqlite_stat1 التقديرية. الخطوة السريعة
+        تقرأ عداد الإدراج فقط، والصيانة الكاملة (exact) تعد الصفوف لتلتقط الحذف.
+        """
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS maintenance_stats (
+                table_name TEXT PRIMARY KEY,
+                row_count INTEGER NOT NULL,
+                insert_seq INTEGER NOT NULL,
+                analyzed_at TEXT
+            )
+        ''')
+        snapshots = {row[0]: (row[1], row[2]) for row in
+                     conn.execute("SELECT table_name, row_count, insert_seq FROM maintenance_stats")}
+        sequences = dict(conn.execute("SELECT name, seq FROM sqlite_sequence"))
+
+        stale = []
+        for table in TABLES:
+            seq = sequences.get(table, 0)
+            snapshot = snapshots.get(table)
+            if snapshot is None:
+                if seq:
+                    stale.append(table)
+                continue
+
+            row_count, insert_seq = snapshot
+            inserted = seq - insert_seq
+            changes = inserted
+            if exact:
+                count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                changes += row_count + inserted - count  # الصفوف المحذوفة
+            if changes > max(row_count * STALE_STATS_RATIO, STALE_STATS_MIN_CHANGES):
+                stale.append(table)
+
+        if stale:
+            conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+            for table in stale:
+                conn.execute(f"ANALYZE {table}")
+                conn.execute('''
+                    INSERT OR REPLACE INTO maintenance_stats
+                        (table_name, row_count, insert_seq, analyzed_at)
+                    VALUES (?, (SELECT COUNT(*) FROM {0}),
+                            COALESCE((SELECT seq FROM sqlite_sequence WHERE name = ?), 0),
+                            datetime('now'))
+                '''.format(table), (table, table))
+        return stale
+
+    # ==================== تقرير الصحة ====================
+
+    def health(self) -> Dict[str, object]:
+        """ملخص صحة القاعدة"""
+        with self._connect() as conn:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+
+            row_counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                          for table in TABLES}
+
+            tables, indexes, unused_ratio = self._space_usage(conn)
+
+        file_size = None
+        if self.db.db_path != ":memory:" and os.path.exists(self.db.db_path):
+            file_size = os.path.getsize(self.db.db_path)
+
+        return {
+            "file_size": file_size,
+            "page_size": page_size,
+            "page_count": page_count,
+            "freelist_pages": freelist,
+            "auto_vacuum": {0: "NONE", 1: "FULL", 2: "INCREMENTAL"}.get(auto_vacuum, auto_vacuum),
+            "row_counts": row_counts,
+            "table_sizes": tables,
+            "index_sizes": indexes,
+            "free_ratio": round(freelist / page_count, 4) if page_count else 0,
+            "unused_ratio": unused_ratio,
+        }
+
+    @staticmethod
+    def _space_usage(conn):
+        """
+        أحجام الجداول والفهارس ونسبة المساحة غير المستخدمة داخل الصفحات
+        (تتطلب جدول dbstat، وتُرجع قيماً فارغة إذا لم يكن متاحاً)
+        """
+        try:
+            rows = conn.execute('''
+                SELECT s.name, m.type, SUM(s.pgsize), SUM(s.unused)
+                FROM dbstat s
+                JOIN sqlite_master m ON m.name = s.name
+                GROUP BY s.name
+            ''').fetchall()
+        except sqlite3.Error:
+            return None, None, None
+
+        tables = {name: size for name, kind, size, _ in rows if kind == "table"}
+        indexes = {name: size for name, kind, size, _ in rows if kind == "index"}
+        total = sum(size for _, _, size, _ in rows)
+        unused = sum(free for _, _, _, free in rows)
+        return tables, indexes, round(unused / total, 4) if total else 0
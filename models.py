@@ -7,12 +7,29 @@ from typing import Optional
 from datetime import datetime
 
 
+# حالات الطلب
+ORDER_STATUS_IN_PROGRESS = "قيد التنفيذ"
+ORDER_STATUS_READY = "جاهز"
+ORDER_STATUS_DELIVERED = "تم التسليم"
+ORDER_STATUS_CANCELLED = "ملغي"
+ORDER_STATUSES = [ORDER_STATUS_IN_PROGRESS, ORDER_STATUS_READY,
+                  ORDER_STATUS_DELIVERED, ORDER_STATUS_CANCELLED]
+
+# حالات الموعد
+APPOINTMENT_STATUS_SCHEDULED = "مجدول"
+APPOINTMENT_STATUS_COMPLETED = "مكتمل"
+APPOINTMENT_STATUS_CANCELLED = "ملغي"
+APPOINTMENT_STATUSES = [APPOINTMENT_STATUS_SCHEDULED, APPOINTMENT_STATUS_COMPLETED,
+                        APPOINTMENT_STATUS_CANCELLED]
+
+
 @dataclass
 class Customer:
     """نموذج العميل"""
     id: Optional[int] = None
     name: str = ""
     phone: str = ""
+    phone_key: Optional[str] = None  # رقم الهاتف بصيغة E.164 للبحث والفهرس الفريد
     address: str = ""
     email: str = ""
     created_at: Optional[str] = None
@@ -24,6 +41,7 @@ class Customer:
             'id': self.id,
             'name': self.name,
             'phone': self.phone,
+            'phone_key': self.phone_key,
             'address': self.address,
             'email': self.email,
             'created_at': self.created_at,
@@ -37,6 +55,7 @@ class Customer:
             id=data.get('id'),
             name=data.get('name', ''),
             phone=data.get('phone', ''),
+            phone_key=data.get('phone_key'),
             address=data.get('address', ''),
             email=data.get('email', ''),
             created_at=data.get('created_at'),
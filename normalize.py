@@ -0,0 +1,80 @@
+"""
+توحيد أرقام الهواتف والأسماء لنظام CRM محل الخياطة
+
+تُستخدم الصيغة الموحدة كمفتاح فهرس فريد لأرقام الهواتف، وكمفتاح تجميع
+(blocking) لاكتشاف العملاء المكررين دون مقارنة كل عميل بكل عميل.
+"""
+
+import hashlib
+import re
+from typing import Optional
+
+
+# رمز الدولة الافتراضي للأرقام المحلية (السعودية)
+DEFAULT_COUNTRY_CODE = "966"
+
+# الأرقام العربية الهندية والفارسية إلى أرقام لاتينية
+DIGITS_TABLE = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹", "0123456789" * 2)
+
+# التشكيل والتطويل
+DIACRITICS_RE = re.compile("[ً-ْٰـ]")
+
+# توحيد أشكال الحروف المتقاربة
+LETTERS_TABLE = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ى": "ي", "ئ": "ي",
+    "ؤ": "و",
+    "ة": "ه",
+})
+
+NON_WORD_RE = re.compile(r"[^\w\s]")
+SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_phone(phone: Optional[str], country_code: str = DEFAULT_COUNTRY_CODE) -> Optional[str]:
+    """
+    تحويل رقم الهاتف إلى صيغة E.164 (مثل +966501234567)
+
+    "0501234567" و "+966501234567" و "050 123 4567" تعطي نفس المفتاح.
+    يُرجع None إذا لم يكن الرقم صالحاً.
+    """
+    if not phone:
+        return None
+
+    phone = phone.strip().translate(DIGITS_TABLE)
+    digits = re.sub(r"\D", "", phone)
+    if not digits:
+        return None
+
+    if phone.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0"):
+        digits = country_code + digits[1:]
+    elif len(digits) == 9 and digits.startswith("5"):
+        # رقم جوال محلي بدون الصفر
+        digits = country_code + digits
+
+    if not 8 <= len(digits) <= 15:
+        return None
+    return "+" + digits
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """توحيد الاسم: إزالة التشكيل وتوحيد الحروف والمسافات"""
+    if not name:
+        return ""
+    name = DIACRITICS_RE.sub("", name).translate(LETTERS_TABLE).lower()
+    name = NON_WORD_RE.sub(" ", name)
+    # "عبد الله" و "عبدالله" اسم واحد
+    name = re.sub(r"\bعبد\s+", "عبد", name)
+    return SPACES_RE.sub(" ", name).strip()
+
+
+def name_block_key(name: Optional[str]) -> Optional[str]:
+    """مفتاح تجميع للاسم (تجزئة للكلمات المرتبة) لاكتشاف التكرار"""
+    tokens = sorted(normalize_name(name).split())
+    if not tokens:
+        return None
+    return hashlib.blake2b(" ".join(tokens).encode("utf-8"), digest_size=8).hexdigest()
@@ -0,0 +1,283 @@
+"""
+جدولة تذكيرات التسليم والمواعيد والمبالغ المتأخرة لنظام CRM محل الخياطة
+
+تُحفظ التذكيرات القادمة في كومة صغرى (min-heap) مرتبة بوقت الاستحقاق،
+وتُملأ من استعلامات نطاق على فهارس التواريخ فقط. عند تغيير طلب أو موعد
+يُعاد حساب تذكيرات الصفوف المتغيرة وحدها دون مسح الجداول.
+"""
+
+import csv
+import heapq
+import itertools
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from models import (ORDER_STATUS_DELIVERED, ORDER_STATUS_CANCELLED,
+                    APPOINTMENT_STATUS_SCHEDULED)
+
+
+# أنواع التذكيرات
+REMINDER_DELIVERY = "delivery"
+REMINDER_APPOINTMENT = "appointment"
+REMINDER_BALANCE = "balance"
+
+REMINDER_TITLES = {
+    REMINDER_DELIVERY: "تسليم طلب",
+    REMINDER_APPOINTMENT: "موعد",
+    REMINDER_BALANCE: "مبلغ متأخر",
+}
+
+# كم يوماً قبل الحدث يظهر التذكير، ونافذة التحميل المسبق، وساعة الإظهار
+DELIVERY_LEAD_DAYS = 1
+APPOINTMENT_LEAD_DAYS = 1
+HORIZON_DAYS = 7
+REMINDER_HOUR = "09:00"
+
+
+@dataclass(order=True)
+class Reminder:
+    """تذكير واحد مستحق في وقت محدد"""
+    due_at: str
+    kind: str = field(compare=False)
+    ref_id: int = field(compare=False)
+    event_date: str = field(compare=False)
+    customer_name: str = field(compare=False, default="")
+    phone: str = field(compare=False, default="")
+    details: str = field(compare=False, default="")
+    amount: Optional[float] = field(compare=False, default=None)
+
+    @property
+    def title(self):
+        """عنوان نوع التذكير"""
+        return REMINDER_TITLES[self.kind]
+
+    def to_dict(self):
+        """تحويل التذكير إلى قاموس"""
+        return {
+            'due_at': self.due_at,
+            'kind': self.kind,
+            'title': self.title,
+            'ref_id': self.ref_id,
+            'event_date': self.event_date,
+            'customer_name': self.customer_name,
+            'phone': self.phone,
+            'details': self.details,
+            'amount': self.amount,
+        }
+
+
+def _shift(date: str, days: int) -> Optional[str]:
+    """إزاحة تاريخ (YYYY-MM-DD) بعدد من الأيام، أو None إذا لم يكن تاريخاً صالحاً"""
+    try:
+        shifted = datetime.strptime((date or "")[:10], "%Y-%m-%d") + timedelta(days=days)
+    except ValueError:
+        return None
+    return shifted.strftime("%Y-%m-%d")
+
+
+# أقل تاريخ صالح: يستبعد التواريخ الفارغة من استعلامات النطاق
+MIN_DATE = "0000-01-01"
+
+
+class ReminderScheduler:
+    """كومة التذكيرات القادمة مع تحديث تدريجي من تغييرات منطق العمل"""
+
+    def __init__(self, crm, horizon_days: int = HORIZON_DAYS):
+        self.crm = crm
+        self.db = crm.db
+        self.horizon_days = horizon_days
+
+        self._heap: List[tuple] = []
+        self._entries: Dict[tuple, Reminder] = {}  # (kind, ref_id) -> التذكير الحالي
+        self._surfaced = set()                     # تذكيرات ظهرت للمستخدم
+        self._counter = itertools.count()
+        self._seeded_until: Optional[str] = None
+        self._today: Optional[str] = None
+
+        self.seed()
+        crm.add_listener(self.on_change)
+
+    # ==================== التحميل من القاعدة ====================
+
+    def seed(self):
+        """تحميل تذكيرات نافذة الأيام القادمة من استعلامات النطاق"""
+        today = datetime.now().strftime("%Y-%m-%d")
+        self._heap.clear()
+        self._entries.clear()
+        self._today = today
+        self._seeded_until = _shift(today, self.horizon_days)
+
+        self._load_orders(today, self._seeded_until)
+        self._load_appointments(today, self._seeded_until)
+        self._load_balances(today)
+
+    def _extend_window(self):
+        """عند بداية يوم جديد: تحميل اليوم الذي دخل النافذة فقط"""
+        today = datetime.now().strftime("%Y-%m-%d")
+        if today == self._today:
+            return
+        until = _shift(today, self.horizon_days)
+        self._load_orders(self._seeded_until, until)
+        self._load_appointments(self._seeded_until, until)
+        # التسليمات التي مر موعدها دون سداد تصبح مبالغ متأخرة
+        self._load_balances(today, since=self._today)
+        self._today = today
+        self._seeded_until = until
+
+    def _load_orders(self, date_from: str, date_to: str, ids=None):
+        query = '''
+            SELECT o.id, o.delivery_date, o.order_type, c.name, c.phone
+            FROM orders o
+            JOIN customers c ON o.customer_id = c.id
+            WHERE o.delivery_date >= ? AND o.delivery_date < ?
+              AND o.status NOT IN (?, ?)
+        '''
+        params = [date_from, date_to, ORDER_STATUS_DELIVERED, ORDER_STATUS_CANCELLED]
+        if ids is not None:
+            query += " AND o.id IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(ids))
+        for row in self.db.execute_query(query, params) or []:
+            due = _shift(row['delivery_date'], -DELIVERY_LEAD_DAYS)
+            if due is None:
+                continue
+            self._push(Reminder(
+                due_at=f"{due} {REMINDER_HOUR}",
+                kind=REMINDER_DELIVERY, ref_id=row['id'], event_date=row['delivery_date'],
+                customer_name=row['name'], phone=row['phone'] or "",
+                details=row['order_type']))
+
+    def _load_appointments(self, date_from: str, date_to: str, ids=None):
+        query = '''
+            SELECT a.id, a.date, a.time, a.purpose, c.name, c.phone
+            FROM appointments a
+            JOIN customers c ON a.customer_id = c.id
+            WHERE a.date >= ? AND a.date < ? AND a.status = ?
+        '''
+        params = [date_from, date_to, APPOINTMENT_STATUS_SCHEDULED]
+        if ids is not None:
+            query += " AND a.id IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(ids))
+        for row in self.db.execute_query(query, params) or []:
+            due = _shift(row['date'], -APPOINTMENT_LEAD_DAYS)
+            if due is None:
+                continue
+            self._push(Reminder(
+                due_at=f"{due} {REMINDER_HOUR}",
+                kind=REMINDER_APPOINTMENT, ref_id=row['id'],
+                event_date=f"{row['date']} {row['time']}",
+                customer_name=row['name'], phone=row['phone'] or "",
+                details=row['purpose']))
+
+    def _load_balances(self, today: str, since: Optional[str] = None, ids=None):
+        # الشرط total_amount > paid_amount يطابق الفهرس الجزئي idx_orders_unpaid_delivery
+        query = '''
+            SELECT o.id, o.delivery_date, o.order_type,
+                   o.total_amount - o.paid_amount AS remaining, c.name, c.phone
+            FROM orders o
+            JOIN customers c ON o.customer_id = c.id
+            WHERE o.total_amount > o.paid_amount
+              AND o.delivery_date >= ? AND o.delivery_date < ?
+              AND o.status != ?
+        '''
+        params = [since or MIN_DATE, today, ORDER_STATUS_CANCELLED]
+        if ids is not None:
+            query += " AND o.id IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(ids))
+        for row in self.db.execute_query(query, params) or []:
+            due = _shift(row['delivery_date'], 1)
+            if due is None:
+                continue
+            self._push(Reminder(
+                due_at=f"{due} {REMINDER_HOUR}",
+                kind=REMINDER_BALANCE, ref_id=row['id'], event_date=row['delivery_date'],
+                customer_name=row['name'], phone=row['phone'] or "",
+                details=row['order_type'], amount=row['remaining']))
+
+    # ==================== الكومة ====================
+
+    def _push(self, reminder: Reminder):
+        key = (reminder.kind, reminder.ref_id)
+        self._entries[key] = reminder
+        heapq.heappush(self._heap, (reminder.due_at, next(self._counter), reminder))
+
+    def _remove(self, kinds, ids) -> Dict[tuple, str]:
+        """
+        حذف كسول: يبقى العنصر في الكومة ويُتجاهل عند إخراجه.
+        يُرجع وقت استحقاق التذكيرات المحذوفة التي ظهرت للمستخدم
+        """
+        surfaced = {}
+        for kind in kinds:
+            for ref_id in ids:
+                key = (kind, ref_id)
+                reminder = self._entries.pop(key, None)
+                if key in self._surfaced:
+                    self._surfaced.discard(key)
+                    if reminder is not None:
+                        surfaced[key] = reminder.due_at
+        return surfaced
+
+    def _restore_surfaced(self, surfaced: Dict[tuple, str]):
+        """التذكير الذي ظهر لا يظهر مجدداً إلا إذا تغير وقت استحقاقه"""
+        for key, due_at in surfaced.items():
+            reminder = self._entries.get(key)
+            if reminder is not None and reminder.due_at == due_at:
+                self._surfaced.add(key)
+
+    def on_change(self, table: str, ids: List[int]):
+        """إعادة حساب تذكيرات الصفوف المتغيرة فقط"""
+        if table == "orders":
+            surfaced = self._remove((REMINDER_DELIVERY, REMINDER_BALANCE), ids)
+            self._load_orders(self._today, self._seeded_until, ids)
+            self._load_balances(self._today, ids=ids)
+        elif table == "appointments":
+            surfaced = self._remove((REMINDER_APPOINTMENT,), ids)
+            self._load_appointments(self._today, self._seeded_until, ids)
+        elif table == "customers":
+            # تغير اسم العميل أو هاتفه أو دُمج: تحديث تذكيرات طلباته ومواعيده
+            for child in ("orders", "appointments"):
+                rows = self.db.execute_query(
+                    f"SELECT id FROM {child} WHERE customer_id IN (SELECT value FROM json_each(?))",
+                    (json.dumps(ids),)) or []
+                if rows:
+                    self.on_change(child, [row[0] for row in rows])
+            return
+        else:
+            return
+        self._restore_surfaced(surfaced)
+
+    def pop_due(self, now: Optional[datetime] = None) -> List[Reminder]:
+        """إخراج التذكيرات التي حان وقتها ولم تظهر بعد"""
+        self._extend_window()
+        now = (now or datetime.now()).strftime("%Y-%m-%d %H:%M")
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, reminder = heapq.heappop(self._heap)
+            key = (reminder.kind, reminder.ref_id)
+            if self._entries.get(key) is reminder and key not in self._surfaced:
+                self._surfaced.add(key)
+                due.append(reminder)
+        return due
+
+    def surfaced(self) -> List[Reminder]:
+        """التذكيرات التي ظهرت للمستخدم بحالتها الحالية"""
+        return sorted(self._entries[key] for key in self._surfaced if key in self._entries)
+
+    def worklist(self, day: Optional[str] = None) -> List[Reminder]:
+        """قائمة عمل يوم معين: كل التذكيرات المستحقة حتى نهاية ذلك اليوم"""
+        self._extend_window()
+        day_end = f"{day or self._today} 23:59"
+        return sorted(r for r in self._entries.values() if r.due_at <= day_end)
+
+    def export_worklist(self, path: str, day: Optional[str] = None) -> int:
+        """تصدير قائمة العمل اليومية إلى ملف CSV وإرجاع عدد البنود"""
+        reminders = self.worklist(day)
+        with open(path, "w", encoding="utf-8-sig", newline="") as fh:
+            writer = csv.writer(fh)
+            writer.writerow(["الاستحقاق", "النوع", "العميل", "رقم الهاتف",
+                             "التاريخ", "التفاصيل", "المبلغ"])
+            for r in reminders:
+                writer.writerow([r.due_at, r.title, r.customer_name, r.phone, r.event_date,
+                                 r.details, "" if r.amount is None else f"{r.amount:.2f}"])
+        return len(reminders)
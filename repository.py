@@ -0,0 +1,178 @@
+"""
+طبقة المستودع العامة لنظام CRM محل الخياطة
+
+تُبنى جمل SQL لكل نموذج مرة واحدة من حقول الـ dataclass في models.py
+وتُخزَّن مؤقتاً، ثم تُربط المعاملات بالترتيب دون بناء قواميس في كل استدعاء.
+"""
+
+import json
+from dataclasses import fields
+from functools import lru_cache
+from operator import attrgetter
+from typing import Dict, Iterable, Optional
+
+from models import Customer, Order, Measurement, Appointment, Payment
+
+
+# الجدول المقابل لكل نموذج
+TABLES = {
+    Customer: "customers",
+    Order: "orders",
+    Measurement: "measurements",
+    Appointment: "appointments",
+    Payment: "payments",
+}
+
+# أعمدة تُكتب عند الإدراج فقط ولا تُعدَّل بعد ذلك
+INSERT_ONLY_COLUMNS = ("created_at",)
+
+
+class ModelSQL:
+    """جمل SQL المبنية مسبقاً لنموذج واحد"""
+
+    def __init__(self, model):
+        self.model = model
+        self.table = TABLES[model]
+
+        # ترتيب الأعمدة هو ترتيب حقول الـ dataclass ليمكن بناء النموذج بالموضع
+        self.columns = tuple(f.name for f in fields(model))
+        self.insert_columns = tuple(c for c in self.columns if c != "id")
+        self.update_columns = tuple(c for c in self.insert_columns
+                                    if c not in INSERT_ONLY_COLUMNS)
+
+        self.select = f"SELECT {', '.join(self.columns)} FROM {self.table}"
+        self.select_by_id = f"{self.select} WHERE id = ?"
+        self.select_by_ids = f"{self.select} WHERE id IN (SELECT value FROM json_each(?))"
+        self.insert = (f"INSERT INTO {self.table} ({', '.join(self.insert_columns)}) "
+                       f"VALUES ({', '.join('?' * len(self.insert_columns))})")
+        self.update = (f"UPDATE {self.table} "
+                       f"SET {', '.join(c + ' = ?' for c in self.update_columns)} "
+                       f"WHERE id = ?")
+        self.delete = f"DELETE FROM {self.table} WHERE id = ?"
+        self.delete_by_ids = f"DELETE FROM {self.table} WHERE id IN (SELECT value FROM json_each(?))"
+
+        # استخراج المعاملات كصف (tuple) مباشرة من سمات النموذج
+        self.insert_params = attrgetter(*self.insert_columns)
+        self.update_params = attrgetter(*self.update_columns, "id")
+
+        self._find_cache: Dict[tuple, str] = {}
+        self._update_cache: Dict[tuple, str] = {}
+        self._bulk_update_cache: Dict[tuple, str] = {}
+
+    def find(self, where: Optional[str] = None, order_by: Optional[str] = None) -> str:
+        """جملة SELECT بشرط وترتيب، تُبنى مرة واحدة لكل تركيبة"""
+        key = (where, order_by)
+        query = self._find_cache.get(key)
+        if query is None:
+            query = self.select
+            if where:
+                query += f" WHERE {where}"
+            if order_by:
+                query += f" ORDER BY {order_by}"
+            self._find_cache[key] = query
+        return query
+
+    def partial_update(self, columns: tuple) -> str:
+        """جملة UPDATE لمجموعة محددة من الأعمدة، تُبنى مرة واحدة لكل مجموعة"""
+        query = self._update_cache.get(columns)
+        if query is None:
+            unknown = set(columns).difference(self.update_columns)
+            if unknown:
+                raise ValueError(f"أعمدة غير معروفة في {self.table}: {', '.join(sorted(unknown))}")
+            query = (f"UPDATE {self.table} "
+                     f"SET {', '.join(c + ' = ?' for c in columns)} "
+                     f"WHERE id = ?")
+            self._update_cache[columns] = query
+        return query
+
+    def bulk_update(self, columns: tuple) -> str:
+        """جملة UPDATE واحدة لمجموعة أعمدة على عدة صفوف"""
+        query = self._bulk_update_cache.get(columns)
+        if query is None:
+            query = self.partial_update(columns).replace(
+                "WHERE id = ?", "WHERE id IN (SELECT value FROM json_each(?))")
+            self._bulk_update_cache[columns] = query
+        return query
+
+
+@lru_cache(maxsize=None)
+def model_sql(model) -> ModelSQL:
+    """الحصول على جمل SQL المخزنة لنموذج (تُبنى عند أول طلب فقط)"""
+    return ModelSQL(model)
+
+
+class Repository:
+    """مستودع عام لعمليات الإدراج والقراءة والتحديث والحذف لنموذج واحد"""
+
+    def __init__(self, db, model):
+        self.db = db
+        self.model = model
+        self.sql = model_sql(model)
+
+    def _build(self, rows) -> list:
+        """تحويل صفوف الاستعلام إلى نماذج بالموضع"""
+        model = self.model
+        return [model(*row) for row in rows] if rows else []
+
+    def insert(self, obj) -> Optional[int]:
+        """إدراج نموذج وإرجاع ID الصف الجديد"""
+        obj.id = self.db.execute_insert(self.sql.insert, self.sql.insert_params(obj))
+        return obj.id
+
+    def get(self, obj_id: int):
+        """الحصول على نموذج بواسطة ID"""
+        rows = self.db.execute_query(self.sql.select_by_id, (obj_id,))
+        return self.model(*rows[0]) if rows else None
+
+    def get_many(self, ids: Iterable[int]) -> list:
+        """الحصول على عدة نماذج باستعلام واحد مع الحفاظ على ترتيب المعرفات"""
+        ids = list(ids)
+        if not ids:
+            return []
+        rows = self.db.execute_query(self.sql.select_by_ids, (json.dumps(ids),))
+        by_id = {obj.id: obj for obj in self._build(rows)}
+        return [by_id[i] for i in ids if i in by_id]
+
+    def find(self, where: Optional[str] = None, params: tuple = (),
+             order_by: Optional[str] = None) -> list:
+        """الحصول على النماذج المطابقة لشرط"""
+        return self._build(self.db.execute_query(self.sql.find(where, order_by), params))
+
+    def update(self, obj, original=None) -> bool:
+        """
+        تحديث نموذج. عند تمرير النسخة الأصلية تُكتب الأعمدة المتغيرة فقط
+        """
+        if original is None:
+            return self.db.execute_query(self.sql.update, self.sql.update_params(obj)) is not None
+
+        changes = {c: getattr(obj, c) for c in self.sql.update_columns
+                   if getattr(obj, c) != getattr(original, c)}
+        if not changes or list(changes) == ["updated_at"]:
+            return True
+        return self.update_fields(obj.id, changes)
+
+    def update_fields(self, obj_id: int, changes: Dict[str, object]) -> bool:
+        """تحديث أعمدة محددة فقط لصف واحد"""
+        if not changes:
+            return True
+        query = self.sql.partial_update(tuple(changes))
+        return self.db.execute_query(query, (*changes.values(), obj_id)) is not None
+
+    def update_many(self, ids: Iterable[int], changes: Dict[str, object]) -> bool:
+        """تحديث نفس الأعمدة لعدة صفوف بجملة واحدة"""
+        ids = list(ids)
+        if not ids or not changes:
+            return True
+        query = self.sql.bulk_update(tuple(changes))
+        return self.db.execute_query(query, (*changes.values(), json.dumps(ids))) is not None
+
+    def delete(self, obj_id: int) -> bool:
+        """حذف صف بواسطة ID"""
+        return self.db.execute_query(self.sql.delete, (obj_id,)) is not None
+
+    def delete_many(self, ids: Iterable[int]) -> bool:
+        """حذف عدة صفوف بجملة واحدة"""
+        ids = list(ids)
+        if not ids:
+            return True
+        return self.db.execute_query(self.sql.delete_by_ids, (json.dumps(ids),)) is not None
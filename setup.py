@@ -20,6 +20,9 @@ setup(
     long_description_content_type="text/markdown",
     url="https://github.com/username/tailor-crm",
     packages=find_packages(),
+    # الوحدات في المستوى الأعلى (لا توجد حزم) حتى تعمل نقطتا الدخول بعد التثبيت
+    py_modules=["main", "cli", "gui", "logic", "database", "models", "repository",
+                "sync", "normalize", "journal", "reminders", "maintenance", "invoices"],
     classifiers=[
         "Development Status :: 5 - Production/Stable",
         "Intended Audience :: End Users/Desktop",
@@ -39,6 +42,7 @@ setup(
     entry_points={
         "console_scripts": [
             "tailor-crm=main:main",
+            "tailor-crm-cli=cli:main",
         ],
     },
     include_package_data=True,
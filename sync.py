@@ -0,0 +1,440 @@
+"""
+مزامنة الفروع عبر ملفات التغييرات لنظام CRM محل الخياطة
+
+تسجل المشغلات (triggers) كل تغيير على الجداول الخمسة في جدول change_log
+مع رقم إصدار لكل صف ومصدر التغيير (الفرع). يصدّر كل فرع ملفاً مضغوطاً
+بالتغييرات منذ آخر نقطة مزامنة، ويستورد ملف الفرع الآخر بشكل متكرر الأمان
+(idempotent) مع حل تعارض حتمي: الإصدار الأعلى يفوز، وعند التساوي يفوز
+اسم المصدر الأكبر.
+
+الصفوف الموجودة عند التثبيت تأخذ معرفات بذرة مشتركة ("seed:<id>") لأن
+الفروع تبدأ من نسخة واحدة من الملف: ثبّت المزامنة ثم انسخ الملف وامنح
+النسخة اسم فرع جديداً بـ reset_origin (أو ثبّتها على كل نسخة قبل أي تعديل).
+"""
+
+import gzip
+import json
+import os
+import sqlite3
+import uuid
+from typing import Dict, List, Optional
+
+from models import Customer, Order, Measurement, Appointment, Payment
+from repository import model_sql
+
+
+# ترتيب الجداول حسب الاعتماديات (الأب قبل الابن)
+SYNC_MODELS = [Customer, Order, Measurement, Appointment, Payment]
+SYNC_TABLES = [model_sql(model).table for model in SYNC_MODELS]
+
+# المفاتيح الأجنبية التي تُترجم إلى معرفات عامة (uid) عند النقل بين الفروع
+FOREIGN_KEYS = {
+    "orders": {"customer_id": "customers"},
+    "measurements": {"customer_id": "customers", "order_id": "orders"},
+    "appointments": {"customer_id": "customers"},
+    "payments": {"order_id": "orders"},
+}
+
+CHANGESET_FORMAT = 1
+
+# مصدر الصفوف الموجودة قبل تفرع الفروع (تاريخ مشترك لا يُصدر)
+SEED_ORIGIN = "seed"
+
+
+class SyncError(Exception):
+    """خطأ في مزامنة الفروع"""
+
+
+class BranchSync:
+    """التقاط التغييرات وتصديرها واستيرادها بين الفروع"""
+
+    def __init__(self, db, origin: Optional[str] = None):
+        """
+        تهيئة المزامنة لقاعدة بيانات. يُحفظ اسم الفرع (origin) في القاعدة
+        عند أول تشغيل ويُنشأ تلقائياً إذا لم يُحدد
+        """
+        self.db = db
+        self.install(origin)
+        self.origin = self._get_meta("origin")
+
+    # ==================== التثبيت ====================
+
+    def install(self, origin: Optional[str] = None):
+        """إنشاء جداول سجل التغييرات والمشغلات (مرة واحدة)"""
+        with self.db.transaction():
+            self.db.execute_query('''
+                CREATE TABLE IF NOT EXISTS sync_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            ''')
+
+            # صف واحد لكل صف متغير: آخر عملية وإصداره ومصدره
+            self.db.execute_query('''
+                CREATE TABLE IF NOT EXISTS change_log (
+                    table_name TEXT NOT NULL,
+                    row_id INTEGER NOT NULL,
+                    uid TEXT NOT NULL,
+                    op TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    origin TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    PRIMARY KEY (table_name, row_id)
+                )
+            ''')
+            self.db.execute_query(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_change_log_uid ON change_log (table_name, uid)")
+            self.db.execute_query(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_change_log_seq ON change_log (seq)")
+
+            # نقطة المزامنة الأخيرة مع كل فرع
+            self.db.execute_query('''
+                CREATE TABLE IF NOT EXISTS sync_peers (
+                    peer TEXT PRIMARY KEY,
+                    exported_seq INTEGER DEFAULT 0,
+                    imported_at TEXT
+                )
+            ''')
+
+            if self._get_meta("origin") is not None:
+                return
+
+            origin = origin or uuid.uuid4().hex[:12]
+            self._set_meta("origin", origin)
+
+            for table in SYNC_TABLES:
+                for event, op, ref in (("INSERT", "I", "NEW"), ("UPDATE", "U", "NEW"),
+                                       ("DELETE", "D", "OLD")):
+                    self.db.execute_query(self._trigger_sql(table, event, op, ref))
+
+                # الصفوف الموجودة مسبقاً: معرف بذرة يتطابق في كل نسخ الملف نفسه
+                self.db.execute_query(f'''
+                    INSERT OR IGNORE INTO change_log (table_name, row_id, uid, op, version, origin, seq)
+                    SELECT '{table}', id, ? || ':' || id, 'I', 1, ?,
+                           (SELECT COALESCE(MAX(seq), 0) FROM change_log) + id
+                    FROM {table}
+                ''', (SEED_ORIGIN, SEED_ORIGIN))
+
+    @staticmethod
+    def _trigger_sql(table: str, event: str, op: str, ref: str) -> str:
+        """جملة إنشاء مشغل يسجل التغيير في change_log"""
+        return f'''
+            CREATE TRIGGER IF NOT EXISTS sync_{table}_{event.lower()}
+            AFTER {event} ON {table}
+            WHEN NOT EXISTS (SELECT 1 FROM sync_meta WHERE key = 'applying')
+            BEGIN
+                INSERT INTO change_log (table_name, row_id, uid, op, version, origin, seq)
+                VALUES ('{table}', {ref}.id,
+                        (SELECT value FROM sync_meta WHERE key = 'origin') || ':' || {ref}.id,
+                        '{op}', 1,
+                        (SELECT value FROM sync_meta WHERE key = 'origin'),
+                        (SELECT COALESCE(MAX(seq), 0) + 1 FROM change_log))
+                ON CONFLICT (table_name, row_id) DO UPDATE SET
+                    op = excluded.op,
+                    version = change_log.version + 1,
+                    origin = excluded.origin,
+                    seq = excluded.seq;
+            END
+        '''
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        rows = self.db.execute_query("SELECT value FROM sync_meta WHERE key = ?", (key,))
+        return rows[0][0] if rows else None
+
+    def _set_meta(self, key: str, value: str):
+        self.db.execute_query(
+            "INSERT OR REPLACE INTO sync_meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _next_seq(self) -> int:
+        return self.db.execute_query("SELECT COALESCE(MAX(seq), 0) + 1 FROM change_log")[0][0]
+
+    def reset_origin(self, origin: Optional[str] = None) -> str:
+        """
+        منح قاعدة منسوخة من فرع آخر اسم فرع جديداً. التاريخ المنسوخ مشترك
+        مع الفرع الأصلي فيُعد مصدراً إليه مسبقاً
+        """
+        previous = self.origin
+        origin = origin or uuid.uuid4().hex[:12]
+        if origin in (previous, SEED_ORIGIN):
+            raise SyncError(f"اسم الفرع غير صالح: {origin}")
+
+        with self.db.transaction():
+            self._set_meta("origin", origin)
+            self.db.execute_query('''
+                INSERT INTO sync_peers (peer, exported_seq)
+                VALUES (?, (SELECT COALESCE(MAX(seq), 0) FROM change_log))
+                ON CONFLICT (peer) DO UPDATE SET exported_seq = excluded.exported_seq
+            ''', (previous,))
+        self.origin = origin
+        return origin
+
+    # ==================== التصدير ====================
+
+    def export_changes(self, path: str, peer: str, since: Optional[int] = None) -> int:
+        """
+        تصدير التغييرات منذ آخر مزامنة مع الفرع peer إلى ملف مضغوط
+        وإرجاع عدد التغييرات المصدرة. تُستبعد التغييرات القادمة من peer نفسه
+        وصفوف البذرة المشتركة. نقطة المزامنة لا تتقدم إلا بعد كتابة الملف كاملاً
+        """
+        with self.db.transaction():
+            if since is None:
+                rows = self.db.execute_query(
+                    "SELECT exported_seq FROM sync_peers WHERE peer = ?", (peer,))
+                since = rows[0][0] if rows else 0
+
+            log = self.db.execute_query('''
+                SELECT table_name, row_id, uid, op, version, origin, seq
+                FROM change_log
+                WHERE seq > ? AND origin NOT IN (?, ?)
+                ORDER BY seq
+            ''', (since, peer, SEED_ORIGIN))
+
+            until = self.db.execute_query("SELECT COALESCE(MAX(seq), 0) FROM change_log")[0][0]
+            changes = self._collect_changes(log)
+
+        changeset = {
+            "format": CHANGESET_FORMAT,
+            "origin": self.origin,
+            "peer": peer,
+            "since": since,
+            "until": until,
+            "changes": changes,
+        }
+        # ملف مؤقت ثم إعادة تسمية: لا يبقى ملف ناقص باسم الملف المطلوب
+        tmp_path = path + ".tmp"
+        try:
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as fh:
+                json.dump(changeset, fh, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self.db.transaction():
+            self.db.execute_query('''
+                INSERT INTO sync_peers (peer, exported_seq) VALUES (?, ?)
+                ON CONFLICT (peer) DO UPDATE SET exported_seq = MAX(exported_seq, excluded.exported_seq)
+            ''', (peer, until))
+
+        return len(changes)
+
+    def _collect_changes(self, log) -> List[dict]:
+        """قراءة بيانات الصفوف المتغيرة باستعلام واحد لكل جدول"""
+        by_table: Dict[str, list] = {}
+        for entry in log:
+            by_table.setdefault(entry["table_name"], []).append(entry)
+
+        # بيانات الصفوف الحالية
+        data: Dict[str, Dict[int, dict]] = {}
+        for model in SYNC_MODELS:
+            sql = model_sql(model)
+            ids = [e["row_id"] for e in by_table.get(sql.table, []) if e["op"] != "D"]
+            if not ids:
+                continue
+            rows = self.db.execute_query(sql.select_by_ids, (json.dumps(ids),))
+            data[sql.table] = {row["id"]: dict(row) for row in rows}
+
+        # ترجمة المفاتيح الأجنبية إلى معرفات عامة
+        wanted: Dict[str, set] = {}
+        for table, rows in data.items():
+            for column, target in FOREIGN_KEYS.get(table, {}).items():
+                wanted.setdefault(target, set()).update(
+                    row[column] for row in rows.values() if row[column] is not None)
+        uids = {target: self._uids_for(target, ids) for target, ids in wanted.items()}
+
+        # مجموع مدفوعات كل طلب عند التصدير، ليُفصل المدفوع مقدماً عن المدفوعات
+        payments_totals = {}
+        if data.get("orders"):
+            rows = self.db.execute_query('''
+                SELECT order_id, SUM(amount) FROM payments
+                WHERE order_id IN (SELECT value FROM json_each(?))
+                GROUP BY order_id
+            ''', (json.dumps(list(data["orders"])),))
+            payments_totals = {row[0]: row[1] for row in rows}
+
+        changes = []
+        for entry in log:
+            table = entry["table_name"]
+            change = {
+                "table": table,
+                "uid": entry["uid"],
+                "op": entry["op"],
+                "version": entry["version"],
+                "origin": entry["origin"],
+            }
+            if entry["op"] != "D":
+                row = data.get(table, {}).get(entry["row_id"])
+                if row is None:
+                    continue
+                if table == "orders":
+                    change["payments_total"] = payments_totals.get(entry["row_id"], 0)
+                row.pop("id")
+                for column, target in FOREIGN_KEYS.get(table, {}).items():
+                    if row[column] is not None:
+                        row[column] = uids[target].get(row[column], f"{self.origin}:{row[column]}")
+                change["data"] = row
+            changes.append(change)
+        return changes
+
+    def _uids_for(self, table: str, row_ids) -> Dict[int, str]:
+        rows = self.db.execute_query('''
+            SELECT row_id, uid FROM change_log
+            WHERE table_name = ? AND row_id IN (SELECT value FROM json_each(?))
+        ''', (table, json.dumps(list(row_ids))))
+        return {row["row_id"]: row["uid"] for row in rows}
+
+    # ==================== الاستيراد ====================
+
+    def import_changes(self, path: str) -> Dict[str, int]:
+        """
+        استيراد ملف تغييرات من فرع آخر في معاملة واحدة. إعادة استيراد
+        نفس الملف لا تغير شيئاً
+        """
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            changeset = json.load(fh)
+
+        if changeset.get("format") != CHANGESET_FORMAT:
+            raise SyncError(f"صيغة ملف التغييرات غير مدعومة: {changeset.get('format')}")
+        if changeset["origin"] == self.origin:
+            raise SyncError("لا يمكن استيراد ملف تغييرات صادر من نفس الفرع "
+                            "(إذا كانت القاعدة منسوخة من فرع آخر فامنحها اسماً جديداً: sync reset-origin)")
+
+        order = {table: index for index, table in enumerate(SYNC_TABLES)}
+        changes = changeset["changes"]
+        # الإدراج والتحديث من الأب إلى الابن، والحذف من الابن إلى الأب
+        upserts = sorted((c for c in changes if c["op"] != "D"), key=lambda c: order[c["table"]])
+        deletes = sorted((c for c in changes if c["op"] == "D"), key=lambda c: -order[c["table"]])
+
+        stats = {"applied": 0, "skipped": 0, "conflicts": 0}
+        # الطلبات التي تأثر مبلغها المدفوع: order_id -> المدفوع مقدماً (خارج جدول المدفوعات)
+        self._paid_bases: Dict[int, float] = {}
+        with self.db.transaction():
+            # إيقاف المشغلات أثناء تطبيق تغييرات الفرع الآخر
+            self._set_meta("applying", "1")
+            try:
+                for change in upserts + deletes:
+                    stats[self._apply_change(change)] += 1
+                self._recompute_paid_amounts()
+            finally:
+                self.db.execute_query("DELETE FROM sync_meta WHERE key = 'applying'")
+
+            self.db.execute_query('''
+                INSERT INTO sync_peers (peer, imported_at) VALUES (?, datetime('now'))
+                ON CONFLICT (peer) DO UPDATE SET imported_at = excluded.imported_at
+            ''', (changeset["origin"],))
+
+        return stats
+
+    def _apply_change(self, change: dict) -> str:
+        """تطبيق تغيير واحد وإرجاع نتيجته (applied / skipped / conflicts)"""
+        table = change["table"]
+        rows = self.db.execute_query('''
+            SELECT row_id, op, version, origin FROM change_log
+            WHERE table_name = ? AND uid = ?
+        ''', (table, change["uid"]))
+        local = rows[0] if rows else None
+
+        # حل التعارض: الإصدار الأعلى ثم اسم المصدر الأكبر
+        if local and (local["version"], local["origin"]) >= (change["version"], change["origin"]):
+            return "skipped"
+
+        if table == "payments" and local is not None and local["op"] != "D":
+            rows = self.db.execute_query("SELECT order_id FROM payments WHERE id = ?",
+                                         (local["row_id"],))
+            if rows:
+                self._snapshot_paid_base(rows[0][0])
+
+        if change["op"] == "D":
+            if local is None:
+                return "skipped"
+            self.db.execute_query(f"DELETE FROM {table} WHERE id = ?", (local["row_id"],))
+            self._log_applied(table, local["row_id"], change)
+            return "applied"
+
+        data = dict(change["data"])
+        for column, target in FOREIGN_KEYS.get(table, {}).items():
+            if data.get(column) is not None:
+                target_id = self._local_id(target, data[column])
+                if target_id is None:
+                    return "conflicts"
+                data[column] = target_id
+
+        if table == "payments":
+            self._snapshot_paid_base(data["order_id"])
+
+        columns = list(data)
+        self.db.execute_query("SAVEPOINT sync_change")
+        try:
+            if local is not None and local["op"] != "D":
+                assignments = ", ".join(f"{c} = ?" for c in columns)
+                self.db.execute_query(f"UPDATE {table} SET {assignments} WHERE id = ?",
+                                      (*data.values(), local["row_id"]))
+                row_id = local["row_id"]
+            else:
+                # صف جديد، أو صف حُذف محلياً بإصدار أقدم فيُعاد بنفس المعرف
+                if local is not None:
+                    columns = ["id"] + columns
+                    values = (local["row_id"], *data.values())
+                else:
+                    values = tuple(data.values())
+                row_id = self.db.execute_insert(
+                    f"INSERT INTO {table} ({', '.join(columns)}) "
+                    f"VALUES ({', '.join('?' * len(columns))})", values)
+            self._log_applied(table, row_id, change)
+            if table == "orders" and "payments_total" in change:
+                self._paid_bases[row_id] = data["paid_amount"] - change["payments_total"]
+        except sqlite3.IntegrityError:
+            # تعارض قيد فريد (مثل رقم هاتف مسجل في الفرعين)
+            self.db.execute_query("ROLLBACK TO sync_change")
+            self.db.execute_query("RELEASE sync_change")
+            return "conflicts"
+        self.db.execute_query("RELEASE sync_change")
+        return "applied"
+
+    def _snapshot_paid_base(self, order_id: int):
+        """حفظ المدفوع مقدماً لطلب محلي قبل تغيير مدفوعاته"""
+        if order_id is None or order_id in self._paid_bases:
+            return
+        rows = self.db.execute_query('''
+            SELECT o.paid_amount - COALESCE(SUM(p.amount), 0)
+            FROM orders o
+            LEFT JOIN payments p ON p.order_id = o.id
+            WHERE o.id = ?
+            GROUP BY o.id
+        ''', (order_id,))
+        if rows:
+            self._paid_bases[order_id] = rows[0][0]
+
+    def _recompute_paid_amounts(self):
+        """
+        إعادة حساب المبلغ المدفوع للطلبات المتأثرة: المدفوع مقدماً مع مجموع
+        المدفوعات بعد الدمج، بدلاً من أخذ قيمة أحد الفرعين (تضيع دفعات الفرع الآخر)
+        """
+        if not self._paid_bases:
+            return
+        self.db.execute_many('''
+            UPDATE orders SET paid_amount = ? + COALESCE(
+                (SELECT SUM(amount) FROM payments WHERE order_id = ?), 0)
+            WHERE id = ?
+        ''', [(base, order_id, order_id) for order_id, base in self._paid_bases.items()])
+
+    def _local_id(self, table: str, uid: str) -> Optional[int]:
+        rows = self.db.execute_query('''
+            SELECT row_id FROM change_log
+            WHERE table_name = ? AND uid = ? AND op != 'D'
+        ''', (table, uid))
+        return rows[0][0] if rows else None
+
+    def _log_applied(self, table: str, row_id: int, change: dict):
+        """تسجيل التغيير المستورد بإصداره ومصدره الأصليين"""
+        self.db.execute_query('''
+            INSERT INTO change_log (table_name, row_id, uid, op, version, origin, seq)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (table_name, row_id) DO UPDATE SET
+                op = excluded.op,
+                version = excluded.version,
+                origin = excluded.origin,
+                seq = excluded.seq
+        ''', (table, row_id, change["uid"], change["op"], change["version"],
+              change["origin"], self._next_seq()))
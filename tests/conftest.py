@@ -0,0 +1,8 @@
+"""
+إعداد الاختبارات: الوحدات في المستوى الأعلى للمستودع (لا توجد حزمة)
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
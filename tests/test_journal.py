@@ -0,0 +1,129 @@
+"""
+اختبارات سجل الكتابة المؤجلة: الاستعادة بعد التعطل وحماية سجل الجلسة الحية
+"""
+
+import os
+import sqlite3
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from database import Database
+from journal import JournalLockedError, WriteBehindJournal
+from logic import CRMLogic
+from models import Customer, Order, Payment
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# جلسة ذاكرة تكتب ثلاث معاملات ثم تتعطل قبل أي كتابة على القرص
+CRASHING_SESSION = textwrap.dedent('''
+    import functools, os, sys
+    sys.path.insert(0, {root!r})
+    import logic
+    from database import Database
+    from models import Customer, Order, Payment
+
+    # لا كتابة في الخلفية خلال الجلسة
+    logic.Database = functools.partial(Database, flush_interval=3600, flush_batch=10 ** 6)
+    crm = logic.CRMLogic({db!r}, engine="memory")
+    customer_id = crm.add_customer(Customer(name="سالم", phone="0501234567"))
+    order_id = crm.add_order(Order(customer_id=customer_id, order_type="ثوب", total_amount=300))
+    crm.add_payment(Payment(order_id=order_id, amount=120))
+    os._exit(0)
+''')
+
+
+def crash_memory_session(db_path):
+    """تشغيل جلسة ذاكرة في عملية منفصلة تنتهي دون إغلاق القاعدة"""
+    script = CRASHING_SESSION.format(root=ROOT, db=db_path)
+    subprocess.run([sys.executable, "-c", script], check=True, capture_output=True)
+    assert os.path.getsize(WriteBehindJournal.journal_path(db_path)) > 0
+
+
+def read_rows(db_path, query):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(query).fetchall()
+    finally:
+        conn.close()
+
+
+def test_recovery_applies_journal_after_crash(tmp_path):
+    db_path = str(tmp_path / "crm.db")
+    crash_memory_session(db_path)
+
+    CRMLogic(db_path).db.close()
+
+    assert read_rows(db_path, "SELECT name FROM customers") == [("سالم",)]
+    assert read_rows(db_path, "SELECT paid_amount FROM orders") == [(120,)]
+    assert read_rows(db_path, "SELECT amount FROM payments") == [(120,)]
+    assert not os.path.exists(WriteBehindJournal.journal_path(db_path))
+
+
+def test_torn_last_transaction_is_dropped_whole(tmp_path):
+    db_path = str(tmp_path / "crm.db")
+    crash_memory_session(db_path)
+
+    # قطع السطر الأخير (الدفعة وتحديث المبلغ المدفوع) في منتصفه
+    journal_path = WriteBehindJournal.journal_path(db_path)
+    with open(journal_path, "rb") as fh:
+        lines = fh.read().splitlines(keepends=True)
+    with open(journal_path, "wb") as fh:
+        fh.write(b"".join(lines[:-1]) + lines[-1][:len(lines[-1]) // 2])
+
+    CRMLogic(db_path).db.close()
+
+    assert read_rows(db_path, "SELECT COUNT(*) FROM orders") == [(1,)]
+    assert read_rows(db_path, "SELECT COUNT(*) FROM payments") == [(0,)]
+    assert read_rows(db_path, "SELECT paid_amount FROM orders") == [(0,)]
+
+
+def test_disk_session_does_not_consume_live_journal(tmp_path):
+    db_path = str(tmp_path / "crm.db")
+    live = CRMLogic(db_path, engine="memory")
+    customer_id = live.add_customer(Customer(name="سالم", phone="0501234567"))
+    order_id = live.add_order(Order(customer_id=customer_id, order_type="ثوب", total_amount=300))
+    live.add_payment(Payment(order_id=order_id, amount=120))
+
+    other = CRMLogic(db_path)
+    assert os.path.exists(WriteBehindJournal.journal_path(db_path))
+
+    live.db.close()
+    other.db.close()
+
+    assert read_rows(db_path, "SELECT COUNT(*) FROM customers") == [(1,)]
+    assert read_rows(db_path, "SELECT paid_amount FROM orders") == [(120,)]
+
+
+def test_second_memory_session_is_refused(tmp_path):
+    db_path = str(tmp_path / "crm.db")
+    first = Database(db_path, "memory")
+    try:
+        with pytest.raises(JournalLockedError):
+            Database(db_path, "memory")
+    finally:
+        first.close()
+
+    Database(db_path, "memory").close()
+
+
+def test_apply_skips_transactions_already_on_disk(tmp_path):
+    db_path = str(tmp_path / "crm.db")
+    Database(db_path).close()
+    entries = [{"seq": seq, "statements": [{
+        "sql": "INSERT INTO customers (name, phone) VALUES (?, ?)",
+        "params": [f"عميل {seq}", f"050000000{seq}"], "many": False}]} for seq in (1, 2)]
+
+    disk = sqlite3.connect(db_path, isolation_level=None)
+    disk.execute("CREATE TABLE IF NOT EXISTS journal_state (id INTEGER PRIMARY KEY, seq INTEGER)")
+    try:
+        assert WriteBehindJournal._apply(disk, entries[:1]) == 1
+        assert WriteBehindJournal._apply(disk, entries) == 2
+        assert WriteBehindJournal._apply(disk, entries) == 2
+    finally:
+        disk.close()
+
+    assert read_rows(db_path, "SELECT name FROM customers ORDER BY id") == [("عميل 1",), ("عميل 2",)]
@@ -0,0 +1,74 @@
+"""
+اختبارات اكتشاف العملاء المكررين ودمجهم
+"""
+
+import pytest
+
+from logic import CRMLogic
+from models import Appointment, Customer, Measurement, Order, Payment
+
+
+@pytest.fixture
+def crm(tmp_path):
+    crm = CRMLogic(str(tmp_path / "crm.db"))
+    yield crm
+    crm.db.close()
+
+
+def add_legacy_customer(crm, name, phone="", address="", email=""):
+    """عميل من بيانات قديمة دون رقم هاتف موحد (قبل فهرس phone_key)"""
+    return crm.db.execute_insert(
+        "INSERT INTO customers (name, phone, address, email) VALUES (?, ?, ?, ?)",
+        (name, phone, address, email))
+
+
+def groups_by_reason(crm):
+    return {(g['reason'], tuple(c.id for c in g['customers'])): g['confirmed']
+            for g in crm.find_duplicate_customers()}
+
+
+def test_phone_groups_are_confirmed_across_formats(crm):
+    first = add_legacy_customer(crm, "سالم", "0501234567")
+    second = add_legacy_customer(crm, "سالم محمد", "+966 50 123 4567")
+
+    assert groups_by_reason(crm) == {("phone", (first, second)): True}
+
+
+def test_name_groups_need_a_shared_address_or_email(crm):
+    first = add_legacy_customer(crm, "محمد علي", "0501111111", address="الرياض")
+    second = add_legacy_customer(crm, "محمد  علي", "0502222222", address="جدة")
+    assert groups_by_reason(crm) == {("name", (first, second)): False}
+
+    crm.db.execute_query("UPDATE customers SET address = 'الرياض' WHERE id = ?", (second,))
+    assert groups_by_reason(crm) == {("name", (first, second)): True}
+
+
+def test_merge_moves_related_rows_and_fills_missing_fields(crm):
+    keep = add_legacy_customer(crm, "سالم", "0501234567")
+    duplicate = add_legacy_customer(crm, "سالم", "+966501234567", address="الرياض",
+                                    email="salem@example.com")
+    order_id = crm.add_order(Order(customer_id=duplicate, order_type="ثوب", total_amount=300))
+    crm.add_payment(Payment(order_id=order_id, amount=100))
+    crm.add_measurement(Measurement(customer_id=duplicate, height=180))
+    crm.add_appointment(Appointment(customer_id=duplicate, date="2030-01-01", time="10:00"))
+
+    assert crm.merge_customers(keep, [duplicate])
+
+    assert [c.id for c in crm.get_all_customers()] == [keep]
+    customer = crm.get_customer_by_id(keep)
+    assert (customer.address, customer.email, customer.phone_key) == \
+        ("الرياض", "salem@example.com", "+966501234567")
+    for table in ("orders", "measurements", "appointments"):
+        rows = crm.db.execute_query(f"SELECT DISTINCT customer_id FROM {table}")
+        assert [row[0] for row in rows] == [keep]
+    assert crm.get_payments_by_order(order_id)[0].amount == 100
+
+
+def test_merge_with_missing_target_changes_nothing(crm):
+    duplicate = add_legacy_customer(crm, "سالم", "0501234567")
+    crm.add_order(Order(customer_id=duplicate, order_type="ثوب", total_amount=300))
+
+    assert not crm.merge_customers(999, [duplicate])
+
+    assert [c.id for c in crm.get_all_customers()] == [duplicate]
+    assert crm.db.execute_query("SELECT customer_id FROM orders")[0][0] == duplicate
@@ -0,0 +1,24 @@
+"""
+اختبارات العمليات الجماعية على الطلبات
+"""
+
+from logic import CRMLogic
+from models import Customer, Measurement, Order, Payment
+
+
+def test_bulk_delete_removes_payments_and_unlinks_measurements(tmp_path):
+    crm = CRMLogic(str(tmp_path / "crm.db"))
+    customer_id = crm.add_customer(Customer(name="سالم", phone="0501234567"))
+    order_ids = [crm.add_order(Order(customer_id=customer_id, order_type=kind, total_amount=100))
+                 for kind in ("ثوب", "بشت", "سروال")]
+    for order_id in order_ids:
+        crm.add_payment(Payment(order_id=order_id, amount=20))
+        crm.add_measurement(Measurement(customer_id=customer_id, order_id=order_id, height=180))
+
+    assert crm.bulk_delete_orders(order_ids[:2])
+
+    assert [o['id'] for o in crm.get_all_orders()] == order_ids[2:]
+    assert [p['order_id'] for p in crm.get_all_payments()] == order_ids[2:]
+    rows = crm.db.execute_query("SELECT order_id FROM measurements ORDER BY id")
+    assert [row[0] for row in rows] == [None, None, order_ids[2]]
+    crm.db.close()
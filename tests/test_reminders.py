@@ -0,0 +1,56 @@
+"""
+اختبارات تحديث التذكيرات عند تغيير بيانات العملاء
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from logic import CRMLogic
+from models import Appointment, Customer, Order
+from reminders import ReminderScheduler
+
+
+TOMORROW = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+@pytest.fixture
+def crm(tmp_path):
+    crm = CRMLogic(str(tmp_path / "crm.db"))
+    yield crm
+    crm.db.close()
+
+
+def worklist_contacts(scheduler):
+    return sorted((r.kind, r.customer_name, r.phone) for r in scheduler.worklist())
+
+
+def test_customer_update_refreshes_reminders(crm):
+    customer_id = crm.add_customer(Customer(name="سالم", phone="0501234567"))
+    crm.add_order(Order(customer_id=customer_id, order_type="ثوب", delivery_date=TOMORROW))
+    crm.add_appointment(Appointment(customer_id=customer_id, date=TOMORROW, time="10:00"))
+    scheduler = ReminderScheduler(crm)
+
+    customer = crm.get_customer_by_id(customer_id)
+    customer.name = "سالم العتيبي"
+    customer.phone = "0559998887"
+    assert crm.update_customer(customer)
+
+    assert worklist_contacts(scheduler) == [
+        ("appointment", "سالم العتيبي", "0559998887"),
+        ("delivery", "سالم العتيبي", "0559998887"),
+    ]
+
+
+def test_merge_moves_reminders_to_kept_customer(crm):
+    keep = crm.add_customer(Customer(name="سالم", phone="0501234567"))
+    duplicate = crm.add_customer(Customer(name="سالم م", phone="0509999999"))
+    crm.add_order(Order(customer_id=duplicate, order_type="ثوب", delivery_date=TOMORROW))
+    scheduler = ReminderScheduler(crm)
+    assert scheduler.pop_due(datetime.now().replace(hour=23, minute=59))
+
+    assert crm.merge_customers(keep, [duplicate])
+
+    assert worklist_contacts(scheduler) == [("delivery", "سالم", "0501234567")]
+    # التذكير الظاهر لا يظهر مجدداً لأن وقت استحقاقه لم يتغير
+    assert scheduler.pop_due(datetime.now().replace(hour=23, minute=59)) == []
@@ -0,0 +1,162 @@
+"""
+اختبارات مزامنة الفروع عبر ملفات التغييرات باستخدام قاعدتين مؤقتتين
+"""
+
+import shutil
+
+import pytest
+
+from logic import CRMLogic
+from models import Customer, Order, Payment
+from sync import BranchSync, SyncError
+
+
+class Branch:
+    """فرع اختبار: منطق العمل ومزامنته على ملف واحد"""
+
+    def __init__(self, path, origin=None):
+        self.path = str(path)
+        self.crm = CRMLogic(self.path)
+        self.sync = BranchSync(self.crm.db, origin)
+
+    def rows(self, query, params=()):
+        return [tuple(row) for row in self.crm.db.execute_query(query, params)]
+
+
+def exchange(source, target, tmp_path, name="changes.gz"):
+    """تصدير تغييرات source إلى target واستيرادها"""
+    path = str(tmp_path / f"{source.sync.origin}-{name}")
+    source.sync.export_changes(path, target.sync.origin)
+    return target.sync.import_changes(path)
+
+
+@pytest.fixture
+def seeded(tmp_path):
+    """قاعدة فيها بيانات قبل التفرع: عميل وطلب بمدفوع مقدم 10"""
+    path = tmp_path / "seed.db"
+    crm = CRMLogic(str(path))
+    customer_id = crm.add_customer(Customer(name="سالم", phone="0501234567"))
+    crm.add_order(Order(customer_id=customer_id, order_type="ثوب",
+                        total_amount=100, paid_amount=10))
+    crm.add_customer(Customer(name="خالد", phone="0507654321"))
+    crm.db.close()
+    return path
+
+
+@pytest.fixture
+def branches(seeded, tmp_path):
+    """فرعان من نسخة واحدة: التثبيت ثم النسخ ثم اسم فرع جديد للنسخة"""
+    a = Branch(seeded, "a")
+    shutil.copy(seeded, tmp_path / "b.db")
+    b = Branch(tmp_path / "b.db")
+    b.sync.reset_origin("b")
+    return a, b
+
+
+def test_round_trip_and_idempotent_reimport(branches, tmp_path):
+    a, b = branches
+    customer_id = a.crm.add_customer(Customer(name="فهد", phone="0551112223"))
+    order_id = a.crm.add_order(Order(customer_id=customer_id, order_type="بشت", total_amount=500))
+    a.crm.add_payment(Payment(order_id=order_id, amount=200))
+
+    path = str(tmp_path / "a.gz")
+    assert a.sync.export_changes(path, "b") == 3
+    assert b.sync.import_changes(path) == {"applied": 3, "skipped": 0, "conflicts": 0}
+
+    query = '''
+        SELECT c.name, o.order_type, o.paid_amount, p.amount
+        FROM orders o JOIN customers c ON o.customer_id = c.id
+        JOIN payments p ON p.order_id = o.id
+    '''
+    assert b.rows(query) == a.rows(query) == [("فهد", "بشت", 200, 200)]
+
+    assert b.sync.import_changes(path) == {"applied": 0, "skipped": 3, "conflicts": 0}
+    assert b.rows("SELECT COUNT(*) FROM payments") == [(1,)]
+
+
+def test_seed_rows_are_not_exported(branches, tmp_path):
+    a, b = branches
+    assert a.sync.export_changes(str(tmp_path / "a.gz"), "b") == 0
+    assert b.sync.export_changes(str(tmp_path / "b.gz"), "a") == 0
+
+
+def test_copies_installed_separately_share_seed_rows(seeded, tmp_path):
+    shutil.copy(seeded, tmp_path / "b.db")
+    a = Branch(seeded, "a")
+    b = Branch(tmp_path / "b.db", "b")
+
+    a.crm.db.execute_query("UPDATE customers SET address = 'الرياض' WHERE name = 'سالم'")
+    assert exchange(a, b, tmp_path) == {"applied": 1, "skipped": 0, "conflicts": 0}
+    assert b.rows("SELECT address FROM customers WHERE name = 'سالم'") == [("الرياض",)]
+    assert b.rows("SELECT COUNT(*) FROM customers") == [(2,)]
+
+
+def test_copy_after_install_needs_new_origin(seeded, tmp_path):
+    a = Branch(seeded, "a")
+    shutil.copy(seeded, tmp_path / "b.db")
+    b = Branch(tmp_path / "b.db")
+    assert b.sync.origin == "a"
+
+    b.crm.add_customer(Customer(name="نواف", phone="0559990001"))
+    path = str(tmp_path / "b.gz")
+    b.sync.export_changes(path, "a")
+    with pytest.raises(SyncError):
+        a.sync.import_changes(path)
+
+    b.sync.reset_origin("b")
+    b.crm.add_customer(Customer(name="ماجد", phone="0559990002"))
+    assert exchange(b, a, tmp_path) == {"applied": 1, "skipped": 0, "conflicts": 0}
+    assert a.rows("SELECT name FROM customers WHERE name = 'ماجد'") == [("ماجد",)]
+
+
+def test_concurrent_updates_converge_on_higher_origin(branches, tmp_path):
+    a, b = branches
+    a.crm.db.execute_query("UPDATE customers SET address = 'جدة' WHERE name = 'خالد'")
+    b.crm.db.execute_query("UPDATE customers SET address = 'مكة' WHERE name = 'خالد'")
+
+    assert exchange(a, b, tmp_path)["skipped"] == 1
+    assert exchange(b, a, tmp_path)["applied"] == 1
+
+    query = "SELECT address FROM customers WHERE name = 'خالد'"
+    assert a.rows(query) == b.rows(query) == [("مكة",)]
+
+
+def test_delete_against_update_converges(branches, tmp_path):
+    a, b = branches
+    a.crm.db.execute_query("DELETE FROM customers WHERE name = 'خالد'")
+    b.crm.db.execute_query("UPDATE customers SET address = 'مكة' WHERE name = 'خالد'")
+
+    exchange(a, b, tmp_path)
+    exchange(b, a, tmp_path)
+
+    # التساوي في الإصدار: يفوز المصدر الأكبر (b) فيُعاد الصف المحذوف
+    query = "SELECT id, address FROM customers WHERE name = 'خالد'"
+    assert a.rows(query) == b.rows(query) == [(2, "مكة")]
+
+    # حذف بإصدار أعلى يفوز على الطرفين
+    a.crm.db.execute_query("DELETE FROM customers WHERE name = 'خالد'")
+    exchange(a, b, tmp_path, "delete.gz")
+    assert b.rows(query) == []
+
+
+def test_paid_amount_merges_payments_from_both_branches(branches, tmp_path):
+    a, b = branches
+    a.crm.add_payment(Payment(order_id=1, amount=20))
+    b.crm.add_payment(Payment(order_id=1, amount=30))
+
+    exchange(a, b, tmp_path)
+    exchange(b, a, tmp_path)
+
+    query = "SELECT paid_amount, (SELECT SUM(amount) FROM payments) FROM orders"
+    assert a.rows(query) == b.rows(query) == [(60, 50)]
+
+
+def test_failed_export_keeps_changes_for_next_export(branches, tmp_path):
+    a, b = branches
+    a.crm.add_customer(Customer(name="فهد", phone="0551112223"))
+
+    with pytest.raises(OSError):
+        a.sync.export_changes(str(tmp_path / "missing" / "a.gz"), "b")
+
+    assert a.sync.export_changes(str(tmp_path / "a.gz"), "b") == 1
+    assert b.sync.import_changes(str(tmp_path / "a.gz"))["applied"] == 1